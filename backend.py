@@ -22,12 +22,20 @@
 
 # if embeddings:
 #     print("Embeddings model loaded successfully!")
+import student_ingest
+import course_ingest
 from student_ingest import ingest_student_pdf, ingest_student_web, make_student_analysis
 from course_ingest import ingest_college_data, process_course_query, get_reranked_courses
+import asyncio
 import os
 
+import aiofiles
+from concurrent.futures import ThreadPoolExecutor
+
+import json
+
 from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Optional
 
@@ -37,6 +45,45 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Bounded pool shared by every endpoint so blocking ingest/LLM calls can't
+# pile up unbounded threads while still overlapping concurrent requests.
+MAX_WORKER_THREADS = int(os.getenv("MAX_WORKER_THREADS", "8"))
+
+# Uploads are written to disk in chunks of this size so memory stays flat
+# no matter how large the PDF is.
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB
+
+
+@app.on_event("startup")
+async def install_default_executor():
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=MAX_WORKER_THREADS))
+    # Declare the Atlas vector indexes once per process instead of on
+    # every upload; both helpers no-op when the index already exists.
+    # All of this is an optimization: if Atlas is unreachable or the
+    # warm-up query fails, the server must still come up (degraded) rather
+    # than refuse to boot — individual endpoints will surface the errors.
+    for step in (student_ingest.ensure_indexes, course_ingest.ensure_indexes, _warmup):
+        try:
+            await asyncio.to_thread(step)
+        except Exception as e:
+            print(f"Startup step {step.__name__} failed (continuing): {e}")
+
+
+def _warmup():
+    """Pay the cold-path costs at startup instead of on the first request.
+
+    The first mpnet forward pass allocates device context and oneDNN
+    primitives (~1-2 s), and the first Atlas query pays the TLS handshake;
+    doing both here means the first user only sees steady-state latency.
+    """
+    from db import client
+    from models import get_embeddings
+
+    get_embeddings().embed_query("warmup")
+    client.admin.command("ping")
+    course_ingest.vector_store.similarity_search("warmup", k=1)
+
 # Pydantic models for request/response
 class StudentInfo(BaseModel):
     name: str = Field(..., description="Student's full name")
@@ -75,7 +122,7 @@ async def root():
     }
 
 @app.post("/uploadfile/")
-def create_upload_file(file: UploadFile = File(...)):
+async def create_upload_file(file: UploadFile = File(...)):
     if file.content_type != 'application/pdf':
         raise HTTPException(status_code=400, detail="Invalid file type. Only PDF files are accepted.")
     try:
@@ -84,32 +131,37 @@ def create_upload_file(file: UploadFile = File(...)):
             file_object.write(file.file.read())"""
         # Call the ingest function to process and store the PDF content
         #store the file as a temp file and pass the path to the ingest function
-        
+
         # Ensure temp directory exists
         os.makedirs("temp", exist_ok=True)
-        
+
         temp_file_path = f"temp/{file.filename}"
-        with open(temp_file_path, "wb+") as temp_file:
-            temp_file.write(file.file.read())
-        result = ingest_student_pdf(temp_file_path)
+        # Stream the upload in 1 MiB chunks instead of buffering the whole
+        # PDF in one bytes object.
+        async with aiofiles.open(temp_file_path, "wb") as temp_file:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                await temp_file.write(chunk)
+        # Offload the blocking ingest (PDF parsing, embeddings, Mongo writes)
+        # so the event loop keeps serving other requests.
+        result = await asyncio.to_thread(ingest_student_pdf, temp_file_path)
         return {"info": f"file '{file.filename}' processed successfully", "details": result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred while processing the file: {str(e)}")
-    
+
 
 
 @app.post("/uploadlink/")
-def create_upload_link(link: str):
+async def create_upload_link(link: str):
     try:
         # Call the ingest function to process and store the content from the link
-        result = ingest_student_web(link)
+        result = await asyncio.to_thread(ingest_student_web, link)
         return {"info": f"link '{link}' processed successfully", "details": result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred while processing the link: {str(e)}")
 
 
 @app.post("/uploadcourse/")
-def create_upload_course(file: UploadFile = File(...)):
+async def create_upload_course(file: UploadFile = File(...)):
     if file.content_type != 'application/pdf':
         raise HTTPException(status_code=400, detail="Invalid file type. Only PDF files are accepted.")
     try:
@@ -118,14 +170,15 @@ def create_upload_course(file: UploadFile = File(...)):
             file_object.write(file.file.read())"""
         # Call the ingest function to process and store the PDF content
         #store the file as a temp file and pass the path to the ingest function
-        
+
         # Ensure temp directory exists
         os.makedirs("temp", exist_ok=True)
-        
+
         temp_file_path = f"temp/{file.filename}"
-        with open(temp_file_path, "wb+") as temp_file:
-            temp_file.write(file.file.read())
-        result = ingest_college_data(temp_file_path)
+        async with aiofiles.open(temp_file_path, "wb") as temp_file:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                await temp_file.write(chunk)
+        result = await asyncio.to_thread(ingest_college_data, temp_file_path)
         return {"info": f"file '{file.filename}' processed successfully", "details": result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred while processing the file: {str(e)}")
@@ -148,9 +201,9 @@ async def analyze_student_profile(request: StudentAnalysisRequest):
             "student_info": {"name": request.student_info.name}
         }
         
-        # Get student analysis
-        analysis = make_student_analysis(query)
-        
+        # Get student analysis (LLM call runs in the thread pool)
+        analysis = await asyncio.to_thread(make_student_analysis, query)
+
         return {
             "student_name": request.student_info.name,
             "question": request.question,
@@ -171,9 +224,9 @@ async def get_course_recommendations(request: CourseQueryRequest):
     Returns course recommendations from the course agent.
     """
     try:
-        # Get course recommendations
-        recommendations = process_course_query(request.query)
-        course_hits = get_reranked_courses(request.query, limit=6)
+        # Get course recommendations (agent + rerank both block, so offload them)
+        recommendations = await asyncio.to_thread(process_course_query, request.query)
+        course_hits = await asyncio.to_thread(get_reranked_courses, request.query, 6)
 
         return {
             "query": request.query,
@@ -205,12 +258,16 @@ async def integrated_analysis_and_recommendation(request: IntegratedFlowRequest)
             "student_info": {"name": request.student_name}
         }
         
-        student_analysis = make_student_analysis(student_query)
-        
+        student_analysis = await asyncio.to_thread(make_student_analysis, student_query)
+
         # Step 2: Use student analysis as input for course recommendations
-        course_recommendations = process_course_query(student_analysis)
+        # (cache scoped to the student — the analysis text embeds their
+        # name and must never answer for anyone else)
+        course_recommendations = await asyncio.to_thread(
+            process_course_query, student_analysis, request.student_name
+        )
         #Reranking algo
-        course_hits = get_reranked_courses(student_analysis, limit=6)
+        course_hits = await asyncio.to_thread(get_reranked_courses, student_analysis, 6)
 
         return {
             "student_name": request.student_name,
@@ -225,6 +282,41 @@ async def integrated_analysis_and_recommendation(request: IntegratedFlowRequest)
         raise HTTPException(status_code=500, detail=f"Error in integrated flow: {str(e)}")
 
 
+@app.post("/api/analyze-and-recommend/stream")
+async def integrated_analysis_and_recommendation_stream(request: IntegratedFlowRequest):
+    """
+    Stage-streamed variant of the integrated flow.
+
+    The agents return complete messages, so the useful streaming unit here
+    is the pipeline stage: each line of the NDJSON response carries one
+    finished stage (analysis, then recommendations, then reranked hits).
+    The client can render the analysis while the course agent is still
+    running instead of staring at a spinner for the whole flow.
+    """
+    async def stages():
+        try:
+            student_query = {
+                "messages": [{"role": "user", "content": request.question}],
+                "student_info": {"name": request.student_name}
+            }
+
+            student_analysis = await asyncio.to_thread(make_student_analysis, student_query)
+            yield json.dumps({"stage": "student_analysis", "student_analysis": student_analysis}) + "\n"
+
+            course_recommendations = await asyncio.to_thread(
+                process_course_query, student_analysis, request.student_name
+            )
+            yield json.dumps({"stage": "course_recommendations", "course_recommendations": course_recommendations}) + "\n"
+
+            course_hits = await asyncio.to_thread(get_reranked_courses, student_analysis, 6)
+            yield json.dumps({"stage": "course_hits", "course_hits": course_hits}) + "\n"
+        except Exception as e:
+            # The 200 is already on the wire; signal failure in-band.
+            yield json.dumps({"stage": "error", "detail": str(e)}) + "\n"
+
+    return StreamingResponse(stages(), media_type="application/x-ndjson")
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8080)
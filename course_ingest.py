@@ -1,62 +1,119 @@
 from pydantic import BaseModel, Field, ValidationError
 from typing import Annotated
-from bs4 import BeautifulSoup
+from selectolax.parser import HTMLParser
+import hashlib
+import logging
 import re
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain.chat_models import init_chat_model
 from langchain_tavily import TavilySearch
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_mongodb import MongoDBAtlasVectorSearch
-from langchain_community.document_compressors import FlashrankRerank
-from langchain_classic.retrievers import ContextualCompressionRetriever
-from pymongo import MongoClient
+from flashrank import Ranker, RerankRequest
 import os
 from dotenv import load_dotenv
+from db import db, ensure_vector_search_index
+from models import get_embeddings, get_llm
+from prompting import build_context
+from semantic_cache import SemanticCache
 
 load_dotenv(override=True)
 
+# debug-level so ingest progress costs nothing under the default INFO config
+logger = logging.getLogger(__name__)
+
+# Compiled once: this runs for every crawled page.
+_MULTI_BLANK = re.compile(r"\n\s*\n+")
+
+
 def bs4_extractor(html: str) -> str:
-    soup = BeautifulSoup(html, "lxml")
-    text = soup.get_text(separator="\n")
-    return re.sub(r"\n\s*\n+", "\n\n", text).strip()
+    # selectolax (C-backed Modest engine) extracts text ~5-10x faster
+    # than BeautifulSoup+lxml for plain text dumps.
+    tree = HTMLParser(html)
+    text = tree.body.text(separator="\n") if tree.body else ""
+    return _MULTI_BLANK.sub("\n\n", text).strip()
 
 
-MONGODB_URI = os.getenv("MONGODB_URI")
-DB_NAME = "college_seeker"
 COURSE_VECTORS_COLL = "course_vectors"
 VECTOR_INDEX_NAME = os.getenv("VECTOR_INDEX_NAME", "course-index-vector")
 VECTOR_QUERY_K = int(os.getenv("VECTOR_QUERY_K", "12"))
 RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "6"))
 #RERANK_MODEL = os.getenv("RERANK_MODEL", "ms-marco-MultiBERT-L-12")
 
-client = MongoClient(MONGODB_URI)
-db = client[DB_NAME]
+INSERT_BATCH_SIZE = int(os.getenv("INSERT_BATCH_SIZE", "256"))
+
 collection = db[COURSE_VECTORS_COLL]
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-mpnet-base-v2")
+# Shared, content-hash-cached embeddings loaded once per process (models.py).
+embeddings = get_embeddings()
 vector_store = MongoDBAtlasVectorSearch(
     collection=collection,
     embedding=embeddings,
     index_name=VECTOR_INDEX_NAME,
 )
-vector_retriever = vector_store.as_retriever()
-flashrank_compressor = FlashrankRerank()
-compression_retriever = ContextualCompressionRetriever(
-    base_retriever=vector_retriever,
-    base_compressor=flashrank_compressor,
-)
+def ensure_indexes():
+    """Declare the course vector index once (no-op when it already exists)."""
+    ensure_vector_search_index(vector_store, collection, VECTOR_INDEX_NAME)
+
 
-llm = init_chat_model("google_genai:gemini-2.5-flash")
+vector_retriever = vector_store.as_retriever(search_kwargs={"k": VECTOR_QUERY_K})
+# Loaded once at import; rerank() scores every candidate in one batched
+# forward pass instead of the per-pair calls the LangChain compressor made.
+_reranker = Ranker(model_name=os.getenv("RERANK_MODEL", "ms-marco-MiniLM-L-12-v2"), cache_dir=".fr")
+
+llm = get_llm("google_genai:gemini-2.5-flash")
 from langchain.agents import create_agent
 
-from langchain_community.document_loaders import RecursiveUrlLoader
+import asyncio
+from urllib.parse import urljoin, urldefrag
+
+import httpx
+
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "20"))
+
+
+def _extract_links(base_url: str, html: str) -> set[str]:
+    """Collect same-site links from a page, fragment-stripped."""
+    links = set()
+    for node in HTMLParser(html).css("a[href]"):
+        href = node.attributes.get("href")
+        if not href:
+            continue
+        absolute = urldefrag(urljoin(base_url, href)).url
+        if absolute.startswith(base_url):
+            links.add(absolute)
+    return links
+
+
+async def _fetch_documents(urls: list[str]) -> list[Document]:
+    # One shared connection pool; a semaphore caps in-flight requests.
+    sem = asyncio.Semaphore(CRAWL_CONCURRENCY)
+    async with httpx.AsyncClient(follow_redirects=True, timeout=10) as http_client:
+        async def fetch(url):
+            async with sem:
+                try:
+                    resp = await http_client.get(url)
+                    resp.raise_for_status()
+                except httpx.HTTPError:
+                    return None
+                return Document(page_content=bs4_extractor(resp.text), metadata={"source": url})
+
+        docs = await asyncio.gather(*(fetch(url) for url in urls))
+    return [doc for doc in docs if doc is not None and doc.page_content]
+
+
+def _crawl_documents(url: str) -> list[Document]:
+    """One-level crawl: fetch the root synchronously to discover same-site
+    links, then fetch every page concurrently. The crawl is network-bound,
+    so wall time drops roughly linearly with concurrency."""
+    root = httpx.get(url, follow_redirects=True, timeout=10)
+    root.raise_for_status()
+    urls = {urldefrag(url).url} | _extract_links(url, root.text)
+    return asyncio.run(_fetch_documents(sorted(urls)))
+
 
 #non functional function for now
 def ingest_college_data(url):
-    
-    loader=RecursiveUrlLoader(url,extractor=bs4_extractor,prevent_outside=True)
 
-    documents = loader.load()
+    documents = _crawl_documents(url)
 
 
     # print("Documents loaded:", len(documents))
@@ -66,12 +123,30 @@ def ingest_college_data(url):
 
     splitter=RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=100)
     docs= splitter.split_documents(documents)
-    print("Documents after splitting:", len(docs))
+    logger.debug("Documents after splitting: %d", len(docs))
 
-    
-    vector_store.create_vector_search_index(dimensions=768)
 
-    vector_store.add_documents(docs)
+    ensure_indexes()
+
+    # Content-hash ids make re-ingest idempotent: chunks already in Atlas
+    # are skipped before any embedding work happens. The dict also
+    # collapses duplicate chunks within this crawl.
+    ids = [hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest() for doc in docs]
+    existing = set(collection.distinct("_id", {"_id": {"$in": ids}}))
+    fresh = list(dict((i, doc) for i, doc in zip(ids, docs) if i not in existing).items())
+    if not fresh:
+        return
+
+    # Insert in batches so each Atlas round-trip carries a bounded payload.
+    for start in range(0, len(fresh), INSERT_BATCH_SIZE):
+        batch = fresh[start:start + INSERT_BATCH_SIZE]
+        vector_store.add_documents([doc for _, doc in batch], ids=[i for i, _ in batch])
+
+    # New documents can change retrieval results for cached queries — and
+    # any generated answers built on the old retrievals, so the semantic
+    # response cache (and its Mongo mirror) must go with them.
+    _retrieve_context.cache_clear()
+    response_cache.clear()
 
 
 
@@ -87,13 +162,27 @@ tavily_search_tool = TavilySearch(
     topic="general",
 )
 
+from functools import lru_cache
+
+
+@lru_cache(maxsize=256)
+def _retrieve_context(query: str):
+    """Memoized vector retrieval keyed on the query text.
+
+    The agent can loop through several model/tool turns with the same
+    query; caching spares one Atlas vector search round-trip per turn.
+    Returns a tuple so the cached value stays hashable and immutable.
+    """
+    return tuple(vector_retriever.invoke(query))
+
+
 @dynamic_prompt
 def prompt_with_context(request: ModelRequest) -> str:
     """Inject context into state messages."""
-    last_query = request.state["messages"][-1].text
-    retrieved_docs = vector_retriever.invoke(last_query) if last_query else []
+    last_query = (request.state["messages"][-1].text or "").strip()
+    retrieved_docs = _retrieve_context(last_query) if last_query else ()
 
-    docs_content = "\n\n".join(doc.page_content for doc in retrieved_docs)
+    docs_content = build_context(retrieved_docs)
 
     system_message = (
         "You are College‑Seeker Assistant. Use ONLY the retrieved documents below as authoritative context.\n"
@@ -110,19 +199,39 @@ def prompt_with_context(request: ModelRequest) -> str:
 
 agent = create_agent(llm, tools=[tavily_search_tool], middleware=[prompt_with_context])
 
-def process_course_query(query: str):
+from llm_batching import RequestCoalescer
+
+# Coalesces concurrent agent invocations into one batched Gemini call.
+_agent_batcher = RequestCoalescer(agent)
+
+# Semantic cache so near-duplicate queries skip retrieval + LLM generation.
+response_cache = SemanticCache(embeddings, collection=db["query_cache"])
+
+def process_course_query(query: str, scope: str | None = None):
     """Process a course query through the agent.
-    
+
     Args:
         query: The query string to process (typically from student ingest agent)
-    
+        scope: Optional cache partition. The integrated flow passes the
+            student name here: analyses of sparse profiles are near-
+            boilerplate, so without an exact-match partition one student's
+            recommendations could clear the similarity threshold for
+            another's. Generic queries can stay unscoped.
+
     Returns:
         The final agent response
     """
     if not query or not query.strip():
         raise ValueError("Course query cannot be empty.")
 
-    response = agent.invoke({"messages": [{"role": "user", "content": query}]})
+    return response_cache.get_or_compute(
+        query.strip(), lambda: _run_course_agent(query), scope=scope
+    )
+
+
+def _run_course_agent(query: str):
+    """Run the agent end-to-end and flatten its reply (cache-miss path)."""
+    response = _agent_batcher.submit({"messages": [{"role": "user", "content": query}]})
 
     messages = response.get("messages", [])
     if not messages:
@@ -158,18 +267,27 @@ def process_course_query(query: str):
 
 
 def get_reranked_courses(query: str, limit: int | None = None) -> list[dict]:
-    """Return top course documents ranked via contextual compression."""
+    """Return top course documents reranked with the preloaded cross-encoder."""
     if not query or not query.strip():
         #print("nothing here")
         return []
 
-    docs = compression_retriever.invoke(query.strip())
-    if limit is not None:
-        docs = docs[:limit]
+    docs = vector_retriever.invoke(query.strip())
+    if not docs:
+        return []
+
+    ranked = _reranker.rerank(
+        RerankRequest(
+            query=query.strip(),
+            passages=[{"id": i, "text": doc.page_content} for i, doc in enumerate(docs)],
+        )
+    )
+    ranked = ranked[: limit if limit is not None else RERANK_TOP_N]
 
     hits: list[dict] = []
-    for doc in docs:
-        score = doc.metadata.get("relevance_score")
+    for passage in ranked:
+        doc = docs[passage["id"]]
+        score = passage.get("score")
         try:
             score_val = float(score) if score is not None else None
         except (TypeError, ValueError):
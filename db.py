@@ -0,0 +1,82 @@
+# Shared MongoDB client for every ingest/serving module.
+#
+# backend.py transitively imports student_ingest, course_ingest and
+# ingest_to_courses, and each used to open its own MongoClient with default
+# pool settings — several pools competing for the same Atlas cluster. One
+# tuned client keeps connections warm (no ~50-500 ms handshake per new
+# connection) and caps how many sockets the process can open at once.
+import os
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+from pymongo.operations import SearchIndexModel
+
+load_dotenv(override=True)
+
+MONGODB_URI = os.getenv("MONGODB_URI")
+DB_NAME = "college_seeker"
+
+client = MongoClient(
+    MONGODB_URI,
+    maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", "50")),
+    minPoolSize=int(os.getenv("MONGO_MIN_POOL_SIZE", "5")),
+    maxConnecting=int(os.getenv("MONGO_MAX_CONNECTING", "4")),
+    maxIdleTimeMS=int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "60000")),
+    socketTimeoutMS=int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "30000")),
+    connectTimeoutMS=int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "10000")),
+    retryWrites=True,
+)
+
+db = client[DB_NAME]
+
+
+# Indexes confirmed to exist this process; skips even the existence-check
+# round-trip on every ingest after the first.
+_ensured_indexes: set = set()
+
+
+def ensure_vector_search_index(vector_store, collection, index_name, dimensions=768):
+    """Create an Atlas vector search index only if it doesn't exist yet.
+
+    Unconditional create_vector_search_index calls issue an Atlas admin
+    command (and a round-trip) on every ingest; checking the existing
+    search indexes first makes the declaration idempotent and cheap.
+    Once confirmed, the (collection, index) pair is remembered so repeat
+    calls in the same process cost nothing at all.
+    """
+    cache_key = (collection.name, index_name)
+    if cache_key in _ensured_indexes:
+        return
+    try:
+        existing = {ix["name"] for ix in collection.list_search_indexes()}
+    except Exception:
+        existing = set()
+    if index_name in existing:
+        _ensured_indexes.add(cache_key)
+        return
+    # Scalar (int8) quantization stores a quarter of the FP32 bytes per
+    # vector, cutting ANN memory bandwidth; set VECTOR_QUANTIZATION=none
+    # to fall back to full-precision vectors in the index.
+    quantization = os.getenv("VECTOR_QUANTIZATION", "scalar")
+    if quantization in ("scalar", "binary"):
+        definition = {
+            "fields": [
+                {
+                    "type": "vector",
+                    "path": "embedding",
+                    "numDimensions": dimensions,
+                    "similarity": "cosine",
+                    "quantization": quantization,
+                }
+            ]
+        }
+        try:
+            collection.create_search_index(
+                SearchIndexModel(definition=definition, name=index_name, type="vectorSearch")
+            )
+            _ensured_indexes.add(cache_key)
+            return
+        except Exception:
+            pass
+    vector_store.create_vector_search_index(dimensions=dimensions)
+    _ensured_indexes.add(cache_key)
@@ -0,0 +1,84 @@
+# Persistent on-disk embedding cache keyed by content hash.
+#
+# Re-ingesting the same PDF or URL used to re-embed every identical chunk;
+# an mpnet forward pass costs tens of ms on CPU while a SQLite lookup is
+# microseconds. Vectors are keyed by sha256(model_name + chunk_text) so a
+# model change never serves stale embeddings.
+import hashlib
+import os
+import sqlite3
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMB_CACHE_PATH = os.getenv("EMB_CACHE_PATH", "emb_cache.db")
+
+
+class CachedEmbeddings(Embeddings):
+    """Wrap a base Embeddings instance with a SQLite-backed content cache.
+
+    Only texts whose hash is missing from the cache reach the underlying
+    model; hits are answered from disk. Safe to share across threads.
+    """
+
+    def __init__(self, base: Embeddings, cache_path: str = EMB_CACHE_PATH):
+        self.base = base
+        self.model_name = getattr(base, "model_name", base.__class__.__name__)
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings "
+            "(key BLOB PRIMARY KEY, vector BLOB NOT NULL, dtype TEXT NOT NULL DEFAULT 'f4')"
+        )
+        try:
+            # Caches created before the dtype column existed hold f4 blobs.
+            self._conn.execute(
+                "ALTER TABLE embeddings ADD COLUMN dtype TEXT NOT NULL DEFAULT 'f4'"
+            )
+        except sqlite3.OperationalError:
+            pass
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.sha256((self.model_name + text).encode("utf-8")).digest()
+
+    def _lookup(self, keys: list[bytes]) -> dict[bytes, list[float]]:
+        found: dict[bytes, list[float]] = {}
+        with self._lock:
+            for key in set(keys):
+                row = self._conn.execute(
+                    "SELECT vector, dtype FROM embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    found[key] = np.frombuffer(row[0], dtype=row[1]).astype(float).tolist()
+        return found
+
+    def _store(self, keys: list[bytes], vectors: list[list[float]]) -> None:
+        # FP16 halves on-disk size and read bandwidth; mpnet cosine
+        # similarity is robust to the reduced precision.
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, dtype) VALUES (?, ?, 'f2')",
+                [
+                    (key, np.asarray(vec, dtype=np.float16).tobytes())
+                    for key, vec in zip(keys, vectors)
+                ],
+            )
+            self._conn.commit()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self._key(t) for t in texts]
+        cached = self._lookup(keys)
+        miss_idx = [i for i, key in enumerate(keys) if key not in cached]
+        if miss_idx:
+            fresh = self.base.embed_documents([texts[i] for i in miss_idx])
+            self._store([keys[i] for i in miss_idx], fresh)
+            for i, vec in zip(miss_idx, fresh):
+                cached[keys[i]] = vec
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text: str) -> list[float]:
+        # mpnet uses the same encoder for queries and documents, so the
+        # document cache applies to queries too.
+        return self.embed_documents([text])[0]
@@ -1,12 +1,16 @@
 # ingest_courses_llm.py
-import os, re, json
+import asyncio
+import logging
+import os, re
+import msgspec
+import tiktoken
 from datetime import datetime, timezone
-from pymongo import MongoClient, ReplaceOne
+from datasketch import MinHash, MinHashLSH
+from pymongo import UpdateOne
 from langchain_community.document_loaders import RecursiveUrlLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from bs4 import BeautifulSoup
+from selectolax.parser import HTMLParser
 import trafilatura
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_mongodb import MongoDBAtlasVectorSearch
 from langchain_core.documents import Document
 from langchain_community.document_compressors import FlashrankRerank
@@ -16,20 +20,29 @@ from test_chain import build_extractor, CourseSchema
 from pydantic import ValidationError
 from typing import Optional
 
+from db import db, ensure_vector_search_index
+from prompting import build_context
+
+# debug-level so ingest progress costs nothing under the default INFO config
+logger = logging.getLogger(__name__)
+
+# Compiled once: these run for every crawled page / extracted course.
+_MULTI_BLANK = re.compile(r"\n\s*\n+")
+_SLUG = re.compile(r"[^a-z0-9]+")
+
 # --- Config ---
-MONGODB_URI = os.getenv("MONGODB_URI")
-DB_NAME = "college_seeker"
 COURSES_COLL = "courses"                 # structured, user-facing
 COURSE_VECTORS_COLL = "course_vectors"   # for retrieval/ranking
 VECTOR_INDEX_NAME = "course-index-vector"
 EMB_MODEL = "sentence-transformers/all-mpnet-base-v2"
 
-client = MongoClient(MONGODB_URI)
-db = client[DB_NAME]
 courses = db[COURSES_COLL]
 course_vectors = db[COURSE_VECTORS_COLL]
 
-embeddings = HuggingFaceEmbeddings(model_name=EMB_MODEL)
+from models import get_embeddings
+
+# Shared, content-hash-cached embeddings loaded once per process (models.py).
+embeddings = get_embeddings()
 vs = MongoDBAtlasVectorSearch(
     collection=course_vectors,
     embedding=embeddings,
@@ -50,11 +63,18 @@ compression_retriever = ContextualCompressionRetriever(
     base_retriever=vector_retriever,
 )
 
+from semantic_cache import SemanticCache
+
+# Extraction prompts are templated, so near-duplicate queries are common;
+# a similarity hit skips the embed + $vectorSearch + rerank round-trip.
+# In-process only (no Mongo mirror): ingest runs are short-lived scripts.
+_context_cache = SemanticCache(embeddings, threshold=0.97, max_entries=512)
+
 def bs4_extractor(html: str) -> str:
     """
     Extracts clean text from raw HTML.
     - First tries `trafilatura` for article-like, main-body content.
-    - Falls back to BeautifulSoup's text extraction if Trafilatura fails.
+    - Falls back to selectolax's text extraction if Trafilatura fails.
     - Cleans up redundant blank lines and whitespace.
     """
     # Try trafilatura first
@@ -67,18 +87,19 @@ def bs4_extractor(html: str) -> str:
 
     if extracted and extracted.strip():
         # Clean and normalize whitespace
-        text = re.sub(r"\n\s*\n+", "\n\n", extracted)
+        text = _MULTI_BLANK.sub("\n\n", extracted)
         return text.strip()
 
-    # Fallback to BeautifulSoup if trafilatura didn't find main content
-    soup = BeautifulSoup(html, "lxml")
-    text = soup.get_text(separator="\n")
-    return re.sub(r"\n\s*\n+", "\n\n", text).strip()
+    # Fallback: selectolax (C-backed Modest engine) dumps text far faster
+    # than BeautifulSoup+lxml when trafilatura finds no main content.
+    tree = HTMLParser(html)
+    text = tree.body.text(separator="\n") if tree.body else ""
+    return _MULTI_BLANK.sub("\n\n", text).strip()
 
 def course_id_from_struct(s: CourseSchema) -> str:
     # simple deterministic slug
     def slug(x: str) -> str:
-        return re.sub(r"[^a-z0-9]+", "-", x.lower()).strip("-")
+        return _SLUG.sub("-", x.lower()).strip("-")
     return f"{slug(s.institution_name)}__{slug(s.course_name)}"
 
 def summarize_for_embedding(s: CourseSchema) -> str:
@@ -96,39 +117,53 @@ def summarize_for_embedding(s: CourseSchema) -> str:
 
 
 def _try_parse_course_schema(candidate) -> Optional[CourseSchema]:
-    """Attempt to coerce various agent payload shapes into CourseSchema."""
-    if candidate is None:
-        return None
-    if isinstance(candidate, CourseSchema):
-        return candidate
-    if hasattr(candidate, "model_dump"):
-        try:
-            return CourseSchema.model_validate(candidate.model_dump())
-        except ValidationError:
-            return None
-    if isinstance(candidate, dict):
-        try:
-            return CourseSchema.model_validate(candidate)
-        except ValidationError:
+    """Attempt to coerce various agent payload shapes into CourseSchema.
+
+    Branches are ordered for the hot path — LLM replies arrive as JSON
+    strings, then dicts; the structural fallbacks are rare.
+    """
+    match candidate:
+        case None:
             return None
-    if isinstance(candidate, str):
-        text = candidate.strip()
-        if not text:
+        case str():
+            text = candidate.strip()
+            if not text:
+                return None
+            try:
+                # Single jiter pass: parse + validate without materializing
+                # an intermediate Python dict.
+                return CourseSchema.model_validate_json(text)
+            except ValidationError:
+                pass
+            try:
+                # msgspec decodes JSON in one C pass, several times faster
+                # than json.loads on these multi-KB extractor payloads.
+                data = msgspec.json.decode(text)
+            except msgspec.DecodeError:
+                return None
+            return _try_parse_course_schema(data)
+        case dict():
+            try:
+                return CourseSchema.model_validate(candidate)
+            except ValidationError:
+                return None
+        case CourseSchema():
+            return candidate
+        case _ if hasattr(candidate, "model_dump"):
+            try:
+                return CourseSchema.model_validate(candidate.model_dump())
+            except ValidationError:
+                return None
+        case list():
+            for item in candidate:
+                parsed = _try_parse_course_schema(item)
+                if parsed is not None:
+                    return parsed
             return None
-        try:
-            data = json.loads(text)
-        except json.JSONDecodeError:
+        case _ if hasattr(candidate, "__dict__"):
+            return _try_parse_course_schema(candidate.__dict__)
+        case _:
             return None
-        return _try_parse_course_schema(data)
-    if isinstance(candidate, list):
-        for item in candidate:
-            parsed = _try_parse_course_schema(item)
-            if parsed is not None:
-                return parsed
-        return None
-    if hasattr(candidate, "__dict__"):
-        return _try_parse_course_schema(candidate.__dict__)
-    return None
 
 
 def _extract_message_content(message):
@@ -172,8 +207,8 @@ def _parse_agent_response(response) -> CourseSchema:
     raise RuntimeError("Could not parse CourseSchema from agent response.")
 
 
-def invoke_extractor_for_page(extractor, page_url: str, page_text: str) -> CourseSchema:
-    """Invoke the dynamic agent and coerce its reply into a CourseSchema instance."""
+def _extractor_payload(page_url: str, page_text: str) -> dict:
+    """Build the agent input for one page's extraction request."""
     if not page_text or not page_text.strip():
         raise ValueError(f"No page text available for {page_url}")
 
@@ -183,14 +218,109 @@ def invoke_extractor_for_page(extractor, page_url: str, page_text: str) -> Cours
         f"URL: {page_url}\n\n"
         f"PAGE_TEXT:\n{page_text}"
     )
-    response = extractor.invoke(
-        {"messages": [{"role": "user", "content": user_prompt}]}
-    )
+    return {"messages": [{"role": "user", "content": user_prompt}]}
+
+
+def _finalize_course(response, page_url: str) -> CourseSchema:
+    """Coerce an agent reply into CourseSchema and backfill the source URL."""
     course = _parse_agent_response(response)
     if not course.source_url:
-        course.source_url = page_url
+        # CourseSchema is frozen, so backfill via copy instead of assignment.
+        course = course.model_copy(update={"source_url": page_url})
     return course
 
+
+def invoke_extractor_for_page(extractor, page_url: str, page_text: str) -> CourseSchema:
+    """Invoke the dynamic agent and coerce its reply into a CourseSchema instance."""
+    response = extractor.invoke(_extractor_payload(page_url, page_text))
+    return _finalize_course(response, page_url)
+
+
+EXTRACT_CONCURRENCY = int(os.getenv("EXTRACT_CONCURRENCY", "8"))
+
+# Token cap for one page's extraction prompt. Characters are a poor proxy:
+# 100k chars can exceed the model context and trigger slow calls/retries.
+PAGE_TOKEN_BUDGET = int(os.getenv("PAGE_TOKEN_BUDGET", "8000"))
+_ENCODER = tiktoken.get_encoding("cl100k_base")
+
+
+def _truncate_to_tokens(text: str, budget: int = PAGE_TOKEN_BUDGET) -> str:
+    """Trim text to a token budget; a fast len check skips short pages."""
+    if len(text) <= budget:  # <= 1 token per char, so certainly in budget
+        return text
+    tokens = _ENCODER.encode(text)
+    if len(tokens) <= budget:
+        return text
+    return _ENCODER.decode(tokens[:budget])
+
+# Jaccard similarity at which a page is treated as a duplicate of one
+# already extracted. NITW subpages share most of their nav/boilerplate.
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.9"))
+_MINHASH_PERMS = 64
+_SHINGLE_WORDS = 5
+
+
+def _page_minhash(text: str) -> MinHash:
+    """MinHash over 5-word shingles, the standard near-dup signature."""
+    mh = MinHash(num_perm=_MINHASH_PERMS)
+    words = text.split()
+    for i in range(max(len(words) - _SHINGLE_WORDS + 1, 1)):
+        mh.update(" ".join(words[i:i + _SHINGLE_WORDS]).encode("utf-8"))
+    return mh
+
+
+async def _extract_pages(extractor, pages: list[tuple[str, str]]) -> list[CourseSchema]:
+    """Run page extractions concurrently; each one is a blocking-length LLM
+    HTTP request, so overlapping them is the largest latency win in ingest."""
+    sem = asyncio.Semaphore(EXTRACT_CONCURRENCY)
+
+    async def one(page_url, page_text):
+        async with sem:
+            response = await extractor.ainvoke(_extractor_payload(page_url, page_text))
+        return _finalize_course(response, page_url)
+
+    return await asyncio.gather(*(one(url, text) for url, text in pages))
+
+def _retrieve_context_block(query: str) -> str:
+    """Cache-miss path: retrieve + rerank and render the context block."""
+    return build_context(
+        compression_retriever.invoke(query),
+        render=lambda doc: (
+            f"[{doc.metadata.get('source') or doc.metadata.get('url') or 'unknown'}] {doc.page_content}"
+        ),
+    )
+
+
+# Module-level so build_extractor's memoization gets a stable key: a
+# closure redefined per ingest_root call would make every call a cache
+# miss while still pinning each compiled agent in the cache.
+@dynamic_prompt
+def prompt_with_context(request: ModelRequest) -> str:
+    """Inject context into state messages."""
+    last_message = request.state["messages"][-1]
+    last_query = getattr(last_message, "text", None) or getattr(last_message, "content", None)
+    if isinstance(last_message, dict):
+        last_query = last_message.get("content") or last_message.get("text")
+    if not last_query:
+        last_query = str(last_message)
+
+    docs_content = _context_cache.get_or_compute(
+        last_query, lambda: _retrieve_context_block(last_query)
+    ) if last_query else ""
+
+    system_message = (
+        "You are College‑Seeker Assistant. Use ONLY the retrieved documents below as authoritative context.\n"
+        "- For tool calling and in General keep in mind to keep an Indian Context\n"
+        "- Prefer official college pages, admissions pages, government / accreditation sources and cite each factual claim with the source URL.\n"
+        "- Return a concise direct answer (1–3 sentences). Then, when helpful, include a short 'Details' section with bullets for: Program, Degree, Duration, Fees, Eligibility, Important links, Contact.\n"
+        "PLEASE FETCH DATA FROM THE RETRIEVED DOCUMENTS FIRST. THIS IS A MAJOR PRIORITY. You can also user Web Search to provide more context from the retrieved information."
+        "\n\n"
+        f"{docs_content}"
+    )
+
+    return system_message
+
+
 def ingest_root(url: str, max_depth: int = 1):
     # 1) Crawl
     loader = RecursiveUrlLoader(
@@ -205,34 +335,6 @@ def ingest_root(url: str, max_depth: int = 1):
     splitter = RecursiveCharacterTextSplitter(chunk_size=2500, chunk_overlap=200)
     chunks = splitter.split_documents(raw_docs)
 
-    @dynamic_prompt
-    def prompt_with_context(request: ModelRequest) -> str:
-        """Inject context into state messages."""
-        last_message = request.state["messages"][-1]
-        last_query = getattr(last_message, "text", None) or getattr(last_message, "content", None)
-        if isinstance(last_message, dict):
-            last_query = last_message.get("content") or last_message.get("text")
-        if not last_query:
-            last_query = str(last_message)
-
-        context_docs = compression_retriever.invoke(last_query) if last_query else []
-
-        docs_content = "\n\n".join(
-            f"[{doc.metadata.get('source') or doc.metadata.get('url') or 'unknown'}] {doc.page_content}"
-            for doc in context_docs
-        )
-
-        system_message = system_message = (
-            "You are College‑Seeker Assistant. Use ONLY the retrieved documents below as authoritative context.\n"
-            "- For tool calling and in General keep in mind to keep an Indian Context\n"
-            "- Prefer official college pages, admissions pages, government / accreditation sources and cite each factual claim with the source URL.\n"
-            "- Return a concise direct answer (1–3 sentences). Then, when helpful, include a short 'Details' section with bullets for: Program, Degree, Duration, Fees, Eligibility, Important links, Contact.\n"
-            "PLEASE FETCH DATA FROM THE RETRIEVED DOCUMENTS FIRST. THIS IS A MAJOR PRIORITY. You can also user Web Search to provide more context from the retrieved information."
-            "\n\n"
-            f"{docs_content}"
-        )
-
-        return system_message
     extractor = build_extractor(prompt_fn=prompt_with_context)
 
     # 4) Run per URL (merge all chunks from same page before calling LLM)
@@ -240,13 +342,41 @@ def ingest_root(url: str, max_depth: int = 1):
     for d in chunks:
         by_url.setdefault(d.metadata.get("source", url), []).append(d.page_content)
 
+    pages = []
+    for page_url, texts in by_url.items():
+        page_text = _truncate_to_tokens("\n\n".join(texts))  # keep prompt size sane
+        logger.debug("Page text for %s:\n%s", page_url, page_text)
+        pages.append((page_url, page_text))
+
+    # Near-duplicate pages (shared nav/boilerplate) reuse the extraction of
+    # the first page they match instead of spending another LLM call.
+    lsh = MinHashLSH(threshold=NEAR_DUP_THRESHOLD, num_perm=_MINHASH_PERMS)
+    unique_pages = []
+    dup_of = {}
+    for page_url, page_text in pages:
+        signature = _page_minhash(page_text)
+        matches = lsh.query(signature)
+        if matches:
+            dup_of[page_url] = matches[0]
+            logger.debug("Skipping near-duplicate page %s (matches %s)", page_url, matches[0])
+            continue
+        lsh.insert(page_url, signature)
+        unique_pages.append((page_url, page_text))
+
+    # Fan the LLM extraction calls out concurrently instead of one blocking
+    # HTTP request per page in sequence.
+    structured_list = asyncio.run(_extract_pages(extractor, unique_pages))
+    by_canonical = {u: s for (u, _), s in zip(unique_pages, structured_list)}
+    results = [
+        (page_url, by_canonical[page_url]) if page_url in by_canonical
+        else (page_url, by_canonical[dup_of[page_url]].model_copy(update={"source_url": page_url}))
+        for page_url, _ in pages
+    ]
+
     upserts = []
     vec_docs = []
-    for page_url, texts in by_url.items():
-        page_text = "\n\n".join(texts)[:100_000]  # keep prompt size sane
-        print(page_text)
-        structured = invoke_extractor_for_page(extractor, page_url, page_text)
-        print(structured)
+    for page_url, structured in results:
+        logger.debug("Extracted structure for %s: %s", page_url, structured)
         # compute deterministic id & doc
         _id = course_id_from_struct(structured)
         doc = {
@@ -269,11 +399,13 @@ def ingest_root(url: str, max_depth: int = 1):
             "syllabus_summary": structured.syllabus_summary,
             "learning_outcomes": structured.learning_outcomes,
             "career_paths": structured.career_paths,
-            "tags": list({*(structured.topics or []), *(structured.accreditation or [])}),
+            # dict.fromkeys dedupes in one pass and keeps a stable order,
+            # unlike the old set union.
+            "tags": list(dict.fromkeys((structured.topics or []) + (structured.accreditation or []))),
             "source": {"url": structured.source_url, "retrieved_date": datetime.now(timezone.utc)},
             "last_updated": datetime.now(timezone.utc),
         }
-        upserts.append(ReplaceOne({"_id": _id}, doc, upsert=True))
+        upserts.append(UpdateOne({"_id": _id}, {"$set": doc}, upsert=True))
 
         # 5) Vectorize a compact profile for personalization/ranking
         profile = summarize_for_embedding(structured)
@@ -283,11 +415,28 @@ def ingest_root(url: str, max_depth: int = 1):
         ))
 
     if upserts:
-        courses.bulk_write(upserts)
+        # Unordered lets the server pipeline the upserts instead of
+        # applying them strictly one after another.
+        courses.bulk_write(upserts, ordered=False)
     if vec_docs:
         # ensure/declare the Atlas Vector index (idempotent):
-        vs.create_vector_search_index(dimensions=768)
-        vs.add_documents(vec_docs)
+        ensure_vector_search_index(vs, course_vectors, VECTOR_INDEX_NAME)
+        # One batched encode for all profiles, sorted by length so each
+        # SentenceTransformer batch wastes less padding, then a direct
+        # insert with the precomputed vectors instead of re-encoding
+        # through vs.add_documents.
+        order = sorted(range(len(vec_docs)), key=lambda i: len(vec_docs[i].page_content))
+        sorted_vectors = embeddings.embed_documents([vec_docs[i].page_content for i in order])
+        vectors = [None] * len(vec_docs)
+        for pos, vec in zip(order, sorted_vectors):
+            vectors[pos] = vec
+        course_vectors.insert_many(
+            [
+                {"text": doc.page_content, "embedding": vec, **doc.metadata}
+                for doc, vec in zip(vec_docs, vectors)
+            ],
+            ordered=False,
+        )
 
 if __name__ == "__main__":
     ingest_root("https://nitw.ac.in/ap", max_depth=1)
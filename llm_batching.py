@@ -0,0 +1,89 @@
+# Micro-batching for concurrent agent/LLM invocations.
+#
+# Under FastAPI concurrency several users can hit the recommend endpoints
+# at once, and each request used to issue its own agent.invoke() — one
+# HTTP round-trip per caller. Coalescing whatever arrives within a short
+# window into a single Runnable.batch() call lets LangChain pipeline the
+# underlying Gemini requests over shared connections instead.
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BATCH_WINDOW_MS = int(os.getenv("LLM_BATCH_WINDOW_MS", "10"))
+BATCH_MAX_SIZE = int(os.getenv("LLM_BATCH_MAX_SIZE", "8"))
+BATCH_WORKERS = int(os.getenv("LLM_BATCH_WORKERS", "4"))
+
+
+class _Pending:
+    __slots__ = ("payload", "event", "result", "error")
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class RequestCoalescer:
+    """Coalesce concurrent invocations of a runnable into one batch() call.
+
+    Callers block on submit(); a daemon drainer thread collects everything
+    that arrives within the batching window (or up to max_size items) and
+    hands the batch to a worker pool for a single runnable.batch(...),
+    then fans results back out. Only collection is single-threaded —
+    batches themselves overlap, so one in-flight model call never
+    serializes traffic that arrives after its window closed. A lone
+    request always waits out the full window before dispatch, so every
+    call pays up to window_ms of added latency; keep the window small.
+    """
+
+    def __init__(self, runnable, window_ms: int = BATCH_WINDOW_MS, max_size: int = BATCH_MAX_SIZE):
+        self._runnable = runnable
+        self._window = window_ms / 1000.0
+        self._max_size = max_size
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        # Batches dispatch on this pool so the drainer goes straight back
+        # to collecting: a request arriving just after a window closed must
+        # not queue behind the whole in-flight model call.
+        self._pool = ThreadPoolExecutor(max_workers=BATCH_WORKERS)
+        threading.Thread(target=self._drain, daemon=True).start()
+
+    def submit(self, payload):
+        pending = _Pending(payload)
+        self._queue.put(pending)
+        pending.event.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _drain(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self._window
+            while len(batch) < self._max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._pool.submit(self._dispatch, batch)
+
+    def _dispatch(self, batch):
+        try:
+            # Per-item exceptions: one payload's failure (oversized prompt,
+            # content rejection) must not fail its unrelated batch-mates.
+            results = self._runnable.batch(
+                [p.payload for p in batch], return_exceptions=True
+            )
+        except Exception as exc:  # batch-level failure hits every caller
+            results = [exc] * len(batch)
+        for pending, result in zip(batch, results):
+            if isinstance(result, BaseException):
+                pending.error = result
+            else:
+                pending.result = result
+            pending.event.set()
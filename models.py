@@ -0,0 +1,47 @@
+# Single shared model instances for the whole process.
+#
+# backend.py transitively imports student_ingest, course_ingest and
+# ingest_to_courses; each used to construct its own HuggingFaceEmbeddings
+# (mpnet weights, ~420 MB in RAM) and chat model at import time. The
+# lru_cache'd factories below load each model exactly once no matter how
+# many modules ask for it.
+import os
+from functools import lru_cache
+
+import torch
+from langchain.chat_models import init_chat_model
+from langchain_huggingface import HuggingFaceEmbeddings
+
+from embedding_cache import CachedEmbeddings
+
+EMB_MODEL = "sentence-transformers/all-mpnet-base-v2"
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+
+
+@lru_cache(maxsize=1)
+def get_embeddings() -> CachedEmbeddings:
+    """Shared content-hash-cached mpnet embeddings, loaded once."""
+    # EMB_DEVICE pins placement explicitly (e.g. "cuda:1"); otherwise any
+    # available GPU is used rather than leaving it idle during ingest.
+    device = os.getenv("EMB_DEVICE") or ("cuda" if torch.cuda.is_available() else "cpu")
+    model_kwargs = {"device": device}
+    if device.startswith("cuda"):
+        # bf16 halves weight bandwidth and roughly doubles matmul
+        # throughput on Ampere+; sentence-transformers returns fp32 numpy
+        # from encode() regardless, so pooled outputs keep full precision.
+        model_kwargs["model_kwargs"] = {"torch_dtype": torch.bfloat16}
+    return CachedEmbeddings(HuggingFaceEmbeddings(
+        model_name=EMB_MODEL,
+        model_kwargs=model_kwargs,
+        encode_kwargs={
+            "batch_size": EMBED_BATCH_SIZE,
+            "normalize_embeddings": True,
+            "convert_to_numpy": True,
+        },
+    ))
+
+
+@lru_cache(maxsize=None)
+def get_llm(model_name: str = "google_genai:gemini-2.5-flash"):
+    """Shared chat model per model name, initialized once."""
+    return init_chat_model(model_name)
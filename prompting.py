@@ -0,0 +1,34 @@
+# Shared context-window assembly for the dynamic prompt builders.
+#
+# With k=12 retrieved chunks of ~1000 chars and chunk_overlap=200, the
+# naive "\n\n".join ships ~12 KB of prompt per call, much of it
+# near-duplicate across overlapping chunks. Deduplicating by content hash
+# and stopping at a character budget sends proportionally fewer prefill
+# tokens to Gemini, which cuts time-to-first-token directly.
+import hashlib
+import os
+
+CONTEXT_CHAR_BUDGET = int(os.getenv("CONTEXT_CHAR_BUDGET", "6000"))
+
+
+def build_context(docs, budget: int = CONTEXT_CHAR_BUDGET, render=None) -> str:
+    """Join doc contents, skipping exact duplicates and stopping at budget.
+
+    Docs arrive ranked, so truncation drops the least relevant chunks.
+    ``render`` optionally formats a doc into its context line (defaults to
+    the raw page_content).
+    """
+    seen = set()
+    parts = []
+    remaining = budget
+    for doc in docs:
+        digest = hashlib.md5(doc.page_content.encode("utf-8")).digest()
+        if digest in seen:
+            continue
+        seen.add(digest)
+        part = render(doc) if render is not None else doc.page_content
+        parts.append(part)
+        remaining -= len(part)
+        if remaining <= 0:
+            break
+    return "\n\n".join(parts)
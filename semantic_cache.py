@@ -0,0 +1,157 @@
+# Embedding-similarity response cache shared by the agent entry points.
+#
+# The dominant cost of /api/courses/recommend and /api/analyze-and-recommend
+# is the LLM call, not FastAPI. Near-duplicate queries (cosine >= threshold
+# on the mpnet embedding) reuse the previously generated answer and skip
+# retrieval, rerank and generation entirely.
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "1024"))
+
+
+class SemanticCache:
+    """LRU response cache keyed on query embeddings.
+
+    Lookups compare the incoming query embedding against cached entries via
+    cosine similarity; anything at or above ``threshold`` counts as a hit and
+    returns the stored response directly. An optional ``scope`` partitions
+    the cache with exact-match semantics — entries from a different scope are
+    never candidates, no matter how similar their embeddings (e.g. one
+    student's analysis must never answer for another). Entries are optionally
+    mirrored to a Mongo collection (e.g. ``query_cache``) so warm answers
+    survive process restarts. In-flight identical queries are deduplicated so
+    concurrent requests for the same query trigger only one LLM call.
+    """
+
+    def __init__(self, embeddings, collection=None,
+                 threshold=SEMANTIC_CACHE_THRESHOLD,
+                 max_entries=SEMANTIC_CACHE_SIZE):
+        self.embeddings = embeddings
+        self.collection = collection
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (scope, unit embedding, response)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._warmed = False
+
+    # ----- internals -----
+    def _embed(self, query: str) -> np.ndarray:
+        vec = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    @staticmethod
+    def _key(query: str, scope: str | None) -> str:
+        return hashlib.sha256(f"{scope or ''}\x00{query}".encode("utf-8")).hexdigest()
+
+    def _warm_from_collection(self):
+        """Load the most recent mirrored entries once, best-effort."""
+        if self._warmed or self.collection is None:
+            return
+        self._warmed = True
+        try:
+            cursor = (self.collection.find({}, {"embedding": 1, "response": 1, "scope": 1})
+                      .sort("ts", -1).limit(self.max_entries))
+            with self._lock:
+                for doc in cursor:
+                    vec = np.asarray(doc.get("embedding", []), dtype=np.float32)
+                    if vec.size and doc.get("response") is not None:
+                        self._entries.setdefault(
+                            doc["_id"], (doc.get("scope"), vec, doc["response"])
+                        )
+        except Exception:
+            # Cache warm-up is an optimization only; never block serving.
+            pass
+
+    def _match(self, vec: np.ndarray, scope: str | None):
+        with self._lock:
+            for key, (cached_scope, cached_vec, response) in self._entries.items():
+                if cached_scope != scope:
+                    continue
+                if float(np.dot(vec, cached_vec)) >= self.threshold:
+                    self._entries.move_to_end(key)
+                    return response
+        return None
+
+    def _store(self, key: str, vec: np.ndarray, response, scope: str | None):
+        with self._lock:
+            self._entries[key] = (scope, vec, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        if self.collection is not None:
+            try:
+                self.collection.replace_one(
+                    {"_id": key},
+                    {"_id": key, "scope": scope, "embedding": vec.tolist(),
+                     "response": response, "ts": time.time()},
+                    upsert=True,
+                )
+            except Exception:
+                pass
+
+    # ----- public API -----
+    def clear(self, scope: str | None = None):
+        """Drop cached responses, in memory and in the Mongo mirror.
+
+        With a ``scope``, only that partition is dropped; without one the
+        whole cache goes. Ingest paths call this so responses computed from
+        pre-ingest documents can't outlive the data they were based on.
+        """
+        with self._lock:
+            if scope is None:
+                self._entries.clear()
+            else:
+                for key in [k for k, (s, _, _) in self._entries.items() if s == scope]:
+                    del self._entries[key]
+        if self.collection is not None:
+            try:
+                self.collection.delete_many({} if scope is None else {"scope": scope})
+            except Exception:
+                pass
+
+    def get_or_compute(self, query: str, compute, scope: str | None = None):
+        """Return a cached response for ``query`` or run ``compute()`` once.
+
+        ``scope`` restricts candidate entries to the same exact scope value;
+        only the query text participates in the similarity comparison.
+        """
+        self._warm_from_collection()
+        vec = self._embed(query)
+        hit = self._match(vec, scope)
+        if hit is not None:
+            return hit
+
+        key = self._key(query, scope)
+        with self._lock:
+            event = self._inflight.get(key)
+            if event is None:
+                self._inflight[key] = event = threading.Event()
+                owner = True
+            else:
+                owner = False
+
+        if not owner:
+            # Another thread is computing the same query; wait and reuse.
+            event.wait()
+            hit = self._match(vec, scope)
+            if hit is not None:
+                return hit
+            return compute()
+
+        try:
+            response = compute()
+            self._store(key, vec, response, scope)
+            return response
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
@@ -3,16 +3,23 @@ College Seeker - Streamlit Frontend
 A user-friendly interface for getting personalized college and course recommendations
 """
 
+import gc
+import json
 import os
 import re
+import threading
+import time
+import uuid
 from datetime import timedelta
 from pathlib import Path
 from dotenv import load_dotenv
 
 load_dotenv(override=True)
 
-import pandas as pd
-import requests
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import httpx
 import streamlit as st
 from pymongo import MongoClient
 from course_ingest import get_reranked_courses
@@ -29,26 +36,150 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+@st.cache_resource(show_spinner=False)
+def _tune_gc() -> bool:
+    """Once per process: keep the cyclic collector off the rerun path.
+
+    Each rerun churns thousands of short-lived widget/element objects, and
+    a generational pass landing mid-keystroke shows up as typing lag.
+    Freezing exempts the import-time graph (LangChain, model handles) from
+    future scans; main() runs one explicit collect per rerun instead.
+    Guarded by cache_resource because Streamlit re-executes this module on
+    every rerun — an unguarded freeze would move each rerun's surviving
+    objects into the permanent generation, leaking them forever.
+    """
+    gc.freeze()
+    gc.disable()
+    return True
+
 # =========================
 # Backend API Helpers
 # =========================
+@st.cache_resource(show_spinner=False)
+def _api_session() -> "requests.Session":
+    """Pooled keep-alive session shared across reruns.
+
+    A bare requests.get/post opens a fresh TCP+TLS connection per call;
+    for the small payloads this app sends, that handshake dominates.
+    Imported here (not at module top) so the requests/urllib3 stack loads
+    once when the cached session is first built, off the cold-start path.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    # cache_resource is shared across user sessions, so size the pool for
+    # concurrent viewers, not a single browser tab.
+    adapter = HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=20,
+        max_retries=Retry(total=3, backoff_factor=0.2),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Plain module global (not st.cache_resource): the status probe also runs
+# from the background poller thread, which has no ScriptRunContext, and
+# routing it through Streamlit caching from there logs warnings forever.
+_probe_session = None
+_probe_session_lock = threading.Lock()
+
+
+def _get_probe_session():
+    global _probe_session
+    with _probe_session_lock:
+        if _probe_session is None:
+            import requests
+
+            _probe_session = requests.Session()
+        return _probe_session
+
+
 def check_api_status():
-    """Check if the backend API is running"""
+    """Check if the backend API is running. Safe to call off-thread."""
     try:
-        response = requests.get(f"{API_BASE_URL}/", timeout=5)
+        response = _get_probe_session().get(f"{API_BASE_URL}/", timeout=5)
         return response.status_code == 200
     except Exception:
         return False
 
 
+@st.cache_data(ttl=10, show_spinner=False)
+def _cached_api_status() -> bool:
+    """Probe the backend at most once per ~10s instead of on every rerun."""
+    return check_api_status()
+
+
+@st.cache_resource(show_spinner=False)
+def _executor() -> ThreadPoolExecutor:
+    """Small worker pool for I/O that can overlap with page rendering."""
+    return ThreadPoolExecutor(max_workers=4)
+
+
+@st.cache_resource(show_spinner=False)
+def _status_monitor() -> dict:
+    """Last-known backend status, revalidated by a daemon thread every 8s.
+
+    Stale-while-revalidate: reruns read the flag without ever waiting on
+    the network; the thread keeps it fresher than the cache TTL so even
+    the first rerun after expiry never blocks on a probe.
+    """
+    state = {"ok": False, "checked": False}
+
+    def poll():
+        while True:
+            state["ok"] = check_api_status()
+            state["checked"] = True
+            time.sleep(8)
+
+    threading.Thread(target=poll, daemon=True, name="api-status-monitor").start()
+    return state
+
+
+async def _async_post(client: httpx.AsyncClient, url: str, **kwargs):
+    response = await client.post(url, **kwargs)
+    response.raise_for_status()
+    return response.json()
+
+
+def _post_parallel(calls: list[tuple[str, dict]]) -> list:
+    """POST to the backend, overlapping independent calls.
+
+    All requests in one batch share a single AsyncClient pool and run via
+    asyncio.gather, so a flow needing several backend calls pays max()
+    instead of sum() of their latencies. The client is created per batch:
+    AsyncClient is bound to its event loop, and each Streamlit interaction
+    drives its own asyncio.run, so a cache_resource client would go stale.
+    """
+    async def run():
+        # HTTP/1.1 on purpose: the backend is local uvicorn, which doesn't
+        # negotiate HTTP/2, so multiplexing comes from pooled connections.
+        limits = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+        async with httpx.AsyncClient(
+            limits=limits, timeout=httpx.Timeout(600, connect=10)
+        ) as client:
+            return await asyncio.gather(*(_async_post(client, url, **kw) for url, kw in calls))
+
+    return asyncio.run(run())
+
+
 def upload_pdf(file):
     """Upload a PDF file to the backend"""
     try:
+        # Hand httpx the buffered reader so the body streams in chunks —
+        # never .getvalue(), which would copy the whole PDF into RAM.
+        # Rewind first: a retried upload leaves the cursor at EOF.
+        file.seek(0)
         files = {"file": (file.name, file, "application/pdf")}
-        response = requests.post(f"{API_BASE_URL}/uploadfile/", files=files)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        result = _post_parallel([(f"{API_BASE_URL}/uploadfile/", {"files": files})])[0]
+        # Fresh profile data invalidates any cached recommendations.
+        _fetch_recommendations.clear()
+        st.session_state.pop("fetched_results", None)
+        return result
+    except httpx.HTTPError as e:
         st.error(f"Error uploading file: {str(e)}")
         return None
 
@@ -56,41 +187,89 @@ def upload_pdf(file):
 def upload_link(url):
     """Upload a profile link to the backend"""
     try:
-        response = requests.post(
-            f"{API_BASE_URL}/uploadlink/",
-            params={"link": url}
-        )
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        result = _post_parallel([
+            (f"{API_BASE_URL}/uploadlink/", {"params": {"link": url}}),
+        ])[0]
+        # Fresh profile data invalidates any cached recommendations.
+        _fetch_recommendations.clear()
+        st.session_state.pop("fetched_results", None)
+        return result
+    except httpx.HTTPError as e:
         st.error(f"Error uploading link: {str(e)}")
         return None
 
 
+def _fetch_recommendations_raw(student_name: str, question: str | None):
+    """Uncached backend call; plain function so batch worker threads
+    (which have no ScriptRunContext) can run it without routing through
+    Streamlit caching."""
+    payload = {"student_name": student_name}
+    if question:
+        payload["question"] = question
+
+    return _post_parallel([
+        (f"{API_BASE_URL}/api/analyze-and-recommend", {"json": payload}),
+    ])[0]
+
+
+@st.cache_data(ttl=24 * 60 * 60, show_spinner=False)
+def _fetch_recommendations(student_name: str, question: str | None):
+    """Cached backend call keyed on (name, question).
+
+    The analyze-and-recommend chain costs multiple LLM + search calls, so
+    a repeat click with identical inputs should not rerun it. Errors
+    propagate (Streamlit doesn't cache raised exceptions), and the cache
+    is cleared whenever a new profile is uploaded.
+    """
+    return _fetch_recommendations_raw(student_name, question)
+
+
 def get_recommendations(student_name, question=None):
     """Get integrated analysis and course recommendations"""
     try:
-        payload = {"student_name": student_name}
-        if question:
-            payload["question"] = question
-
-        response = requests.post(
-            f"{API_BASE_URL}/api/analyze-and-recommend",
-            json=payload
-        )
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        return _fetch_recommendations(student_name, question or None)
+    except httpx.HTTPError as e:
         st.error(f"Error getting recommendations: {str(e)}")
         return None
 
 
+def stream_recommendations(student_name, question=None):
+    """Yield progressively-complete result dicts from the staged endpoint.
+
+    Each NDJSON line from the backend carries one finished pipeline stage;
+    yielding the accumulated dict after every line lets the caller paint
+    the profile analysis while the course agent is still running.
+    """
+    payload = {"student_name": student_name}
+    if question:
+        payload["question"] = question
+
+    result = {"student_name": student_name, "question": question}
+    with httpx.stream(
+        "POST",
+        f"{API_BASE_URL}/api/analyze-and-recommend/stream",
+        json=payload,
+        timeout=httpx.Timeout(600, connect=10),
+    ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            if event.get("stage") == "error":
+                raise RuntimeError(event.get("detail") or "recommendation pipeline failed")
+            result.update({k: v for k, v in event.items() if k != "stage"})
+            yield dict(result)
+
+
 def render_course_hits(course_hits: list[dict]):
     """Render reranked course hits returned by the compression retriever."""
     if not course_hits:
         st.info("No AI-ranked course matches yet.")
         return
 
+    import pandas as pd
+
     df = pd.DataFrame(
         [
             {
@@ -122,7 +301,14 @@ def get_mongo_client():
     uri = os.getenv("MONGODB_URI")
     if not uri:
         raise RuntimeError("MONGODB_URI env var not set.")
-    return MongoClient(uri, uuidRepresentation="standard")
+    # One pooled client per Streamlit process; a short server-selection
+    # timeout keeps an unreachable Atlas from hanging page renders.
+    return MongoClient(
+        uri,
+        uuidRepresentation="standard",
+        maxPoolSize=20,
+        serverSelectionTimeoutMS=2000,
+    )
 
 
 def get_collection():
@@ -132,6 +318,28 @@ def get_collection():
     return db["course_vectors"]
 
 
+@st.cache_resource(show_spinner=False)
+def ensure_course_indexes() -> bool:
+    """Declare the browse-page indexes once per process.
+
+    The keyword search needs the compound text index and the course-id
+    prefix filter needs a B-tree; both creations are no-ops when the
+    index already exists. Returns whether the text index is confirmed —
+    unlike a regex filter, $text errors outright without its index, so
+    keyword search must fall back to a regex scan when this is False.
+    """
+    col = get_collection()
+    try:
+        col.create_index([("course_id", 1)], name="course_id_btree")
+    except Exception:
+        pass
+    try:
+        col.create_index([("text", "text"), ("url", "text")], name="course_text_search")
+    except Exception:
+        return False
+    return True
+
+
 def _default_projection():
     """Projection that hides large / noisy fields like embeddings."""
     return {
@@ -145,90 +353,203 @@ def _default_projection():
     }
 
 
-@st.cache_data(ttl=timedelta(minutes=2), show_spinner=False)
-def fetch_courses(filters: dict, page: int, page_size: int, sort=[("text", 1)]):
+@st.cache_data(ttl=timedelta(minutes=2), max_entries=128, show_spinner=False)
+def fetch_courses(filters: dict, page: int, page_size: int, sort=(("_id", 1),)):
     """
     Fetch paginated course docs (excluding embeddings).
     Returns (rows, total_count).
     """
     col = get_collection()
     query = filters or {}
-    total = col.count_documents(query)
-    cursor = (
-        col.find(query, _default_projection())
-           .skip((page - 1) * page_size)
-           .limit(page_size)
-           .sort(sort)
+    if not query:
+        # _id sort is covered by the default index (no in-memory sort of
+        # the raw text field); hint pins the plan and batch_size keeps the
+        # driver from prefetching beyond one page.
+        cursor = (
+            col.find(query, _default_projection())
+               .sort(list(sort))
+               .skip((page - 1) * page_size)
+               .limit(page_size)
+               .hint([("_id", 1)])
+               .batch_size(page_size)
+        )
+        rows = list(cursor)
+    else:
+        # Text searches rank by relevance; everything else keeps the
+        # requested sort.
+        has_text = "$text" in query or any("$text" in c for c in query.get("$and", []))
+        projection = _default_projection()
+        if has_text:
+            projection["score"] = {"$meta": "textScore"}
+            sort_spec = [("score", {"$meta": "textScore"})]
+        else:
+            sort_spec = list(sort)
+        cursor = (
+            col.find(query, projection)
+               .sort(sort_spec)
+               .skip((page - 1) * page_size)
+               .limit(page_size)
+               .batch_size(page_size)
+        )
+        rows = list(cursor)
+    # Counted in its own cache keyed on filters alone, so paging within a
+    # filter set never repeats the (potentially expensive) count.
+    return rows, count_courses(filters)
+
+
+@st.cache_data(ttl=60, max_entries=64, show_spinner=False)
+def count_courses(filters: dict) -> int:
+    """Cached per-filter total; O(1) metadata read when unfiltered."""
+    col = get_collection()
+    if not filters:
+        return col.estimated_document_count()
+    return col.count_documents(filters)
+
+
+# Compiled once at import: course-text parsing runs for every fetched page.
+_COURSE_SPLIT = re.compile(r"\s*\|\s*|—")
+_COURSE_LABELS = r"Level|Mode|Duration|Fee(?:\s*\([^)]*\))?|Eligibility|Accreditation"
+
+# Session-state keys the app owns. Reset buttons pop exactly these instead
+# of st.session_state.clear(), which would also wipe Streamlit's own widget
+# state and any keys other components have stashed.
+_APP_STATE_KEYS = (
+    "profile_uploaded",
+    "student_name",
+    "recommendations",
+    "ai_course_hits",
+    "courses_kw",
+    "courses_id_kw",
+    "courses_page_size",
+    "courses_csv",
+    "courses_csv_page",
+    "download_blob",
+    "fetched_results",
+)
+
+
+def _reset_session():
+    for key in _APP_STATE_KEYS:
+        st.session_state.pop(key, None)
+    sid = st.query_params.get("sid", "")
+    if _SID.fullmatch(sid):
+        _session_file(sid).unlink(missing_ok=True)
+
+
+# Profile/recommendation state survives a Streamlit restart by round-
+# tripping through a small JSON file; the browser carries the session id
+# in the ?sid= query param, so a reload of the same URL picks it back up.
+_SESSION_DIR = Path.home() / ".college_seeker"
+_PERSISTED_KEYS = ("profile_uploaded", "student_name", "recommendations")
+_SID = re.compile(r"[0-9a-f]{32}")
+
+
+def _session_file(sid: str) -> Path:
+    return _SESSION_DIR / f"session_{sid}.json"
+
+
+def _restore_session():
+    """Reload persisted state for the sid in the URL, if any."""
+    sid = st.query_params.get("sid", "")
+    if not _SID.fullmatch(sid):
+        return
+    try:
+        data = json.loads(_session_file(sid).read_text())
+    except (OSError, ValueError):
+        return
+    for key in _PERSISTED_KEYS:
+        if key in data and key not in st.session_state:
+            st.session_state[key] = data[key]
+
+
+def _persist_session():
+    """Write the persisted keys to disk, minting a sid on first save."""
+    sid = st.query_params.get("sid", "")
+    if not _SID.fullmatch(sid):
+        sid = uuid.uuid4().hex
+        st.query_params["sid"] = sid
+    try:
+        _SESSION_DIR.mkdir(parents=True, exist_ok=True)
+        _session_file(sid).write_text(
+            json.dumps({k: st.session_state.get(k) for k in _PERSISTED_KEYS}, default=str)
+        )
+    except OSError:
+        pass
+
+
+# Display order for the courses table; built once rather than per rerun.
+_PREFERRED_COLS = (
+    "Institute", "Course", "Level", "Mode", "Duration",
+    "Fee (INR)", "Eligibility", "Accreditation",
+    "Course ID", "URL", "Last Updated",
+)
+
+
+# Per-column patterns for the vectorized course-text parse. The text looks
+# like: "Institute — Course | Level: X, Mode: Y | Duration: Z years |
+# Fee (INR): ... | Eligibility: ... | Topics: ... | Accreditation: ...";
+# the lookahead handles several labels packed into one pipe segment.
+_COLUMN_PATTERNS = {
+    column: rf"(?i)(?:^|[|,])\s*{label}\s*:\s*(.*?)(?=\s*(?:,\s*(?:{_COURSE_LABELS})\s*:|\||—|$))"
+    for label, column in (
+        ("Level", "Level"),
+        ("Mode", "Mode"),
+        ("Duration", "Duration"),
+        (r"Fee(?:\s*\([^)]*\))?", "Fee (INR)"),
+        ("Eligibility", "Eligibility"),
+        ("Accreditation", "Accreditation"),
     )
-    rows = list(cursor)
-    return rows, total
+}
 
 
-def parse_course_text(doc: dict) -> dict:
-    """
-    Extracts structured fields from a single 'text' string like:
-    "Institute — Course | Level: X, Mode: Y | Duration: Z years | Fee (INR): ... | Eligibility: ... | Topics: ... | Accreditation: ..."
+@st.cache_data(ttl=timedelta(minutes=2), max_entries=128, show_spinner=False)
+def parse_courses_frame(docs: list[dict]):
+    """Parse every fetched row's course text into display columns at once.
 
-    Returns a dict with clean columns for display.
+    pandas' C-level str.extract pulls each column out of every row at
+    once, so rendering a 50-200 row page does a handful of vectorized
+    passes instead of one Python loop per row.
     """
-    text = doc.get("text", "") or ""
-    url = doc.get("url", "") or ""
-    course_id = doc.get("course_id", "") or ""
-    last_updated = doc.get("last_updated", "")
-
-    # Split by pipes and the long dash
-    parts = [p.strip() for p in re.split(r"\s*\|\s*|—", text) if p and p.strip()]
-
-    result = {
-        "Institute": "",
-        "Course": "",
-        "Level": "",
-        "Mode": "",
-        "Duration": "",
-        "Fee (INR)": "",
-        "Eligibility": "",
-        "Accreditation": "",
-        "Course ID": course_id,
-        "URL": url,
-        "Last Updated": last_updated,
-        "Raw": text,  # keep original for search/debug if needed
-    }
+    # Deferred: pandas import costs ~200 ms and only the table pages need
+    # it; Streamlit re-executes this module on every interaction.
+    import pandas as pd
 
-    # Institute and Course (first two chunks if present)
-    if len(parts) >= 2:
-        result["Institute"] = parts[0]
-        result["Course"] = parts[1]
-
-    # Parse remaining labeled chunks
-    for part in parts[2:]:
-        # Support both "Level: Undergraduate, Mode: Full-time" and similar
-        if part.lower().startswith("level:"):
-            result["Level"] = part.split(":", 1)[1].strip()
-        elif part.lower().startswith("mode:"):
-            result["Mode"] = part.split(":", 1)[1].strip()
-        elif part.lower().startswith("duration:"):
-            result["Duration"] = part.split(":", 1)[1].strip()
-        elif part.lower().startswith("fee"):
-            # Handles "Fee (INR): ..." or "Fee:"
-            result["Fee (INR)"] = part.split(":", 1)[1].strip() if ":" in part else part
-        elif part.lower().startswith("eligibility:"):
-            result["Eligibility"] = part.split(":", 1)[1].strip()
-        elif part.lower().startswith("accreditation:"):
-            result["Accreditation"] = part.split(":", 1)[1].strip()
-
-    return result
+    df = pd.DataFrame(docs)
+    text = df["text"].fillna("") if "text" in df.columns else pd.Series("", index=df.index)
+
+    out = pd.DataFrame(index=df.index)
+    halves = text.str.split(_COURSE_SPLIT, n=2, regex=True)
+    out["Institute"] = halves.str[0].fillna("").str.strip()
+    out["Course"] = halves.str[1].fillna("").str.strip()
+    for column, pattern in _COLUMN_PATTERNS.items():
+        out[column] = text.str.extract(pattern)[0].fillna("").str.strip()
+    for source, column in (("course_id", "Course ID"), ("url", "URL"), ("last_updated", "Last Updated")):
+        out[column] = df[source].fillna("") if source in df.columns else ""
+    out["Raw"] = text
+    return out
 
 
 # =========================
 # Page Functions
 # =========================
 def main():
+    _tune_gc()
+
     # Header
     st.title("🎓 College Seeker")
     st.markdown("#### Find Your Perfect College & Course Match")
 
-    # Check API status (non-blocking for the Mongo page)
-    api_ok = check_api_status()
+    # The monitor thread keeps the last-known status warm; only before its
+    # first report does a worker run the plain (Streamlit-free — worker
+    # threads have no ScriptRunContext) probe, overlapping the network
+    # round-trip with rendering instead of delaying first paint. The
+    # result is only awaited where the sidebar badge draws.
+    monitor = _status_monitor()
+    status_future = None if monitor["checked"] else _executor().submit(check_api_status)
+
+    # Refill empty state from disk before defaults mask the saved values.
+    if "profile_uploaded" not in st.session_state:
+        _restore_session()
 
     # Initialize session state
     if "profile_uploaded" not in st.session_state:
@@ -238,23 +559,25 @@ def main():
     if "recommendations" not in st.session_state:
         st.session_state.recommendations = None
 
+    # Native multipage routing: only the selected page's function runs,
+    # and Streamlit renders the navigation widget itself. Explicit
+    # url_paths key each page on URL state, so navigation is a single
+    # rerun, browser history works, and links stay shareable even if a
+    # page title changes.
+    nav = st.navigation([
+        st.Page(_upload_page, title="Upload Profile", icon="📤", url_path="upload"),
+        st.Page(_recommendations_page, title="Get Recommendations", icon="🎯", url_path="recommendations"),
+        st.Page(_about_page, title="About", icon="ℹ️", url_path="about"),
+        st.Page(_generated_page, title="Generated Recommendations", icon="📄", url_path="results"),
+        st.Page(show_courses_page, title="Browse Courses", icon="📚", url_path="courses"),
+        st.Page(show_batch_page, title="Batch Recommendations", icon="🗂️", url_path="batch"),
+    ])
+
     # Sidebar
     with st.sidebar:
-        st.title("📋 Navigation")
-        st.markdown("---")
-        page = st.radio(
-            "Choose a step:",
-            [
-                "1️⃣ Upload Profile",
-                "2️⃣ Get Recommendations",
-                "3️⃣ About",
-                "Generated Recommendations",
-                "4️⃣ Browse Courses",
-            ],
-            index=0 if not st.session_state.profile_uploaded else 1
-        )
-        st.markdown("---")
-        st.markdown("### Status")
+        # One st.markdown per static block: each call is its own element
+        # (and websocket message), so contiguous text is cheaper combined.
+        st.markdown("---\n\n### Status")
         if st.session_state.profile_uploaded and st.session_state.student_name:
             st.success(f"✅ Profile uploaded for:\n**{st.session_state.student_name}**")
         elif st.session_state.student_name:
@@ -262,38 +585,65 @@ def main():
         else:
             st.info("⏳ No profile uploaded yet")
 
-        st.markdown("---")
-        st.markdown("### Quick Actions")
+        st.markdown("---\n\n### Quick Actions")
         if st.button("🔄 Reset Session"):
-            st.session_state.clear()
+            _reset_session()
             st.rerun()
 
-        st.markdown("---")
-        st.markdown("### Backend API")
-        if api_ok:
+        st.markdown("---\n\n### Backend API")
+        # Prefer the monitor's non-blocking last-known value; the future
+        # only backstops the very first rerun before the poller has run.
+        if monitor["ok"] if monitor["checked"] else status_future.result():
             st.success("✅ Backend API is running")
         else:
             st.warning("⚠️ Backend API not reachable")
+        if st.button("🔁 Recheck"):
+            # Drop the cached (possibly stale-negative) status and probe now.
+            _cached_api_status.clear()
+            monitor["ok"] = check_api_status()
+            monitor["checked"] = True
+            st.rerun()
 
-    # Routing
-    if page == "1️⃣ Upload Profile":
-        if not api_ok:
-            st.error("⚠️ Backend API is not running. Please start the backend server first.")
-            st.code("python backend.py", language="bash")
-            st.stop()
-        show_upload_page()
-    elif page == "2️⃣ Get Recommendations":
-        if not api_ok:
-            st.error("⚠️ Backend API is not running. Please start the backend server first.")
-            st.code("python backend.py", language="bash")
-            st.stop()
-        show_recommendations_page()
-    elif page == "Generated Recommendations" and st.session_state.recommendations:
+    # finally: pages end through st.stop() and st.rerun() as well as by
+    # falling off the end, and with the automatic collector disabled the
+    # per-rerun collect must run on every one of those exits.
+    try:
+        nav.run()
+    finally:
+        # Pages have run and mutated state by now; snapshot it for restarts.
+        _persist_session()
+
+        # Reclaim the rerun's cycles now, after the frame is already drawn.
+        gc.collect()
+
+
+def _require_api():
+    """Stop page render early when the backend isn't reachable."""
+    if not _cached_api_status():
+        st.error("⚠️ Backend API is not running. Please start the backend server first.")
+        st.code("python backend.py", language="bash")
+        st.stop()
+
+
+def _upload_page():
+    _require_api()
+    show_upload_page()
+
+
+def _recommendations_page():
+    _require_api()
+    show_recommendations_page()
+
+
+def _about_page():
+    show_about_page(_cached_api_status())
+
+
+def _generated_page():
+    if st.session_state.get("recommendations"):
         display_recommendations(st.session_state.recommendations)
-    elif page == "4️⃣ Browse Courses":
-        show_courses_page()
     else:
-        show_about_page(api_ok)
+        st.info("No generated recommendations yet — run **Get Recommendations** first.")
 
 
 def show_upload_page():
@@ -327,9 +677,10 @@ def show_upload_page():
                             st.balloons()
                             st.success(f"✅ {result.get('info', 'Success')}")
                             st.info(f"📊 {result.get('details', '')}")
-                            st.markdown("---")
-                            st.markdown("### ✨ Next Step")
-                            st.markdown("Go to **'Get Recommendations'** to see your personalized course suggestions!")
+                            st.markdown(
+                                "---\n\n### ✨ Next Step\n\n"
+                                "Go to **'Get Recommendations'** to see your personalized course suggestions!"
+                            )
 
     with tab2:
         with st.container():
@@ -357,9 +708,10 @@ def show_upload_page():
                             st.balloons()
                             st.success(f"✅ {result.get('info', 'Success')}")
                             st.info(f"📊 {result.get('details', '')}")
-                            st.markdown("---")
-                            st.markdown("### ✨ Next Step")
-                            st.markdown("Go to **'Get Recommendations'** to see your personalized course suggestions!")
+                            st.markdown(
+                                "---\n\n### ✨ Next Step\n\n"
+                                "Go to **'Get Recommendations'** to see your personalized course suggestions!"
+                            )
 
 
 def show_recommendations_page():
@@ -384,8 +736,10 @@ def show_recommendations_page():
             if provided_name != previous_name and st.session_state.get("recommendations"):
                 st.session_state.recommendations = None
             st.session_state.student_name = provided_name
-            st.markdown(f"### Hello, **{provided_name}**! 👋")
-            st.markdown("Let's find the perfect college and courses for you.")
+            st.markdown(
+                f"### Hello, **{provided_name}**! 👋\n\n"
+                "Let's find the perfect college and courses for you."
+            )
         else:
             st.session_state.student_name = None
             if st.session_state.get("recommendations"):
@@ -405,29 +759,70 @@ def show_recommendations_page():
                 if not provided_name:
                     st.error("Please enter your full name before requesting recommendations.")
                 else:
-                    with st.spinner("🔍 Analyzing your profile and finding the best matches..."):
-                        question = custom_question.strip() if (custom_question or "").strip() else None
-                        recommendations = get_recommendations(provided_name, question)
-                        if recommendations:
-                            st.session_state.recommendations = recommendations
+                    question = custom_question.strip() if (custom_question or "").strip() else None
+                    # Repeat clicks with identical inputs must not rerun
+                    # the pipeline: results already fetched this session
+                    # are keyed by (name, question) and reused directly.
+                    # Only genuinely new pairs open a stream.
+                    fetched = st.session_state.setdefault("fetched_results", {})
+                    pair = (provided_name, question)
+                    recommendations = fetched.get(pair)
+                    if recommendations is None:
+                        # Stream stage results so the analysis paints while
+                        # the course agent is still running; the plain
+                        # cached call is the fallback if the stream dies.
+                        analysis_box = st.empty()
+                        try:
+                            with st.spinner("🔍 Analyzing your profile and finding the best matches..."):
+                                for partial in stream_recommendations(provided_name, question):
+                                    recommendations = partial
+                                    if partial.get("student_analysis"):
+                                        analysis_box.info(partial["student_analysis"])
+                        except (httpx.HTTPError, RuntimeError, json.JSONDecodeError):
+                            with st.spinner("Retrying without streaming..."):
+                                recommendations = get_recommendations(provided_name, question)
+                        analysis_box.empty()
+                    if recommendations and recommendations.get("course_recommendations"):
+                        fetched[pair] = recommendations
+                        st.session_state.recommendations = recommendations
 
     if st.session_state.get("recommendations"):
         st.success("Recommendations are available for you to view in the 'Generated Recommendations' Tab")
 
 
+@st.cache_data(show_spinner=False)
+def build_report(name: str, timestamp: str, analysis: str, recs: str) -> str:
+    """Assemble the downloadable report once per unique set of inputs."""
+    return f"""
+COLLEGE SEEKER - RECOMMENDATIONS
+================================
+
+Student: {name}
+Date: {timestamp}
+
+PROFILE ANALYSIS:
+{analysis}
+
+COURSE RECOMMENDATIONS:
+{recs}
+"""
+
+
+@st.fragment
 def display_recommendations(recommendations: dict):
-    """Display the recommendations in a nice format"""
-    st.markdown("## 📊 Your Results")
+    """Display the recommendations in a nice format.
 
+    Runs as a fragment: the Prepare Download click replays only this
+    block, not the whole page. The reset-style buttons escalate to a full
+    app rerun since they change state other pages read.
+    """
     # Student Analysis
-    st.markdown("### 🎓 Profile Analysis")
+    st.markdown("## 📊 Your Results\n\n### 🎓 Profile Analysis")
     analysis_text = recommendations.get('student_analysis', 'No analysis available')
     st.info(analysis_text)
 
-    st.markdown("---")
-
     # Course Recommendations
-    st.markdown("### 🏫 Recommended Colleges & Courses")
+    st.markdown("---\n\n### 🏫 Recommended Colleges & Courses")
     course_recs = recommendations.get('course_recommendations', 'No recommendations available')
     st.success(course_recs)
 
@@ -443,35 +838,31 @@ def display_recommendations(recommendations: dict):
     with col1:
         if st.button("🔄 Get New Recommendations"):
             st.session_state.recommendations = None
-            st.rerun()
+            st.rerun(scope="app")
 
     with col2:
         if st.button("📥 Prepare Download"):
-            # Create downloadable text file
-            result_text = f"""
-COLLEGE SEEKER - RECOMMENDATIONS
-================================
-
-Student: {st.session_state.student_name}
-Date: {st.session_state.recommendations.get('timestamp', 'N/A')}
-
-PROFILE ANALYSIS:
-{recommendations.get('student_analysis', 'N/A')}
-
-COURSE RECOMMENDATIONS:
-{recommendations.get('course_recommendations', 'N/A')}
-"""
+            # Built on click (cached across repeat clicks), then kept in
+            # session state so the download button survives the rerun the
+            # click itself triggers.
+            st.session_state.download_blob = build_report(
+                st.session_state.student_name or "N/A",
+                str(st.session_state.recommendations.get("timestamp", "N/A")),
+                recommendations.get("student_analysis", "N/A"),
+                recommendations.get("course_recommendations", "N/A"),
+            )
+        if st.session_state.get("download_blob"):
             st.download_button(
                 label="Download as Text File",
-                data=result_text,
+                data=st.session_state.download_blob,
                 file_name=f"recommendations_{(st.session_state.student_name or 'student').replace(' ', '_')}.txt",
                 mime="text/plain"
             )
 
     with col3:
         if st.button("📤 Upload New Profile"):
-            st.session_state.clear()
-            st.rerun()
+            _reset_session()
+            st.rerun(scope="app")
 
 
 def show_courses_page():
@@ -503,43 +894,83 @@ def show_courses_page():
         if st.session_state.ai_course_hits:
             render_course_hits(st.session_state.ai_course_hits)
 
-    # ── Filters
-    with st.container():
+    # ── Filters (form-batched: one Mongo query per Apply, not per keystroke)
+    _page_sizes = [10, 20, 50, 100]
+    with st.form("course_filters"):
         col_a, col_b, col_c = st.columns([2, 2, 1])
         with col_a:
-            kw = st.text_input(
+            form_kw = st.text_input(
                 "🔍 Search keyword",
+                value=st.session_state.get("courses_kw", ""),
                 placeholder="Search Institute / Course / Eligibility / Accreditation…"
-            ).strip()
+            )
         with col_b:
-            id_kw = st.text_input(
+            form_id_kw = st.text_input(
                 "Filter by Course ID (optional)",
+                value=st.session_state.get("courses_id_kw", ""),
                 placeholder="e.g., thakur-college-of-engineering-technology__b-e-computer-engineering"
-            ).strip()
+            )
         with col_c:
-            page_size = st.selectbox("Rows per page", [10, 20, 50, 100], index=1)
-
-    # Build Mongo query
+            form_page_size = st.selectbox(
+                "Rows per page", _page_sizes,
+                index=_page_sizes.index(st.session_state.get("courses_page_size", 20)),
+            )
+        if st.form_submit_button("Apply filters"):
+            st.session_state.courses_kw = form_kw.strip()
+            st.session_state.courses_id_kw = form_id_kw.strip()
+            st.session_state.courses_page_size = form_page_size
+
+    # Read the applied values so pagination reruns don't need a resubmit.
+    kw = st.session_state.get("courses_kw", "")
+    id_kw = st.session_state.get("courses_id_kw", "")
+    page_size = st.session_state.get("courses_page_size", 20)
+
+    # Build Mongo query. $text probes the compound text index; the old
+    # unanchored case-insensitive $regex forced a collection scan per page.
+    text_index_ok = ensure_course_indexes()
     filters = {}
-    or_clauses = []
+    clauses = []
 
     if kw:
-        or_clauses.extend([
-            {"text": {"$regex": kw, "$options": "i"}},
-            {"url": {"$regex": kw, "$options": "i"}},
-        ])
+        if text_index_ok:
+            clauses.append({"$text": {"$search": kw}})
+        else:
+            # $text errors without its index; degrade to the baseline
+            # case-insensitive regex scan instead of breaking search.
+            safe_kw = re.escape(kw)
+            clauses.append({"$or": [
+                {"text": {"$regex": safe_kw, "$options": "i"}},
+                {"url": {"$regex": safe_kw, "$options": "i"}},
+            ]})
     if id_kw:
-        or_clauses.append({"course_id": {"$regex": id_kw, "$options": "i"}})
+        # Anchored, case-sensitive prefix: course ids are deterministic
+        # lowercase slugs (course_id_from_struct), and only a
+        # case-sensitive regex can prefix-seek the course_id B-tree.
+        clauses.append({"course_id": {"$regex": f"^{re.escape(id_kw.lower())}"}})
+
+    if clauses:
+        filters = clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    _courses_fragment(filters, int(page_size))
 
-    if or_clauses:
-        filters = {"$or": or_clauses}
 
+@st.fragment
+def _courses_fragment(filters: dict, page_size: int):
+    """Pagination, table, and download, scoped to a fragment rerun.
+
+    Page changes and refreshes re-execute only this block — no sidebar
+    rebuild, no status probe, no filter-form churn.
+    """
     # Pagination controls
     col_l, _, col_r = st.columns([1, 2, 1])
     with col_l:
         page = st.number_input("Page", min_value=1, value=1, step=1)
     with col_r:
         refresh = st.button("🔄 Refresh", use_container_width=True)
+    if refresh:
+        # Drop cached pages and totals so the rerun below re-queries Mongo.
+        fetch_courses.clear()
+        count_courses.clear()
 
     # Fetch data
     try:
@@ -550,20 +981,20 @@ def show_courses_page():
             st.info("No courses found with the current filters.")
             return
 
-        # Parse text -> structured columns
-        parsed_rows = [parse_course_text(doc) for doc in docs]
-        df = pd.DataFrame(parsed_rows)
+        # Parse text -> structured columns (vectorized across the page)
+        df = parse_courses_frame(docs)
 
         # Reorder columns
-        preferred_cols = [
-            "Institute", "Course", "Level", "Mode", "Duration",
-            "Fee (INR)", "Eligibility", "Accreditation",
-            "Course ID", "URL", "Last Updated"
-        ]
-        existing_order = [c for c in preferred_cols if c in df.columns]
+        existing_order = [c for c in _PREFERRED_COLS if c in df.columns]
         rest_cols = [c for c in df.columns if c not in existing_order]
         df = df[existing_order + rest_cols]
 
+        # Dictionary-encode the highly repetitive columns so the Arrow
+        # payload st.dataframe ships to the browser stays small.
+        for cat_col in ("Institute", "Level", "Mode", "Accreditation"):
+            if cat_col in df.columns:
+                df[cat_col] = df[cat_col].astype("category")
+
         # Render table (use LinkColumn for URLs)
         max_page = max(1, (total + int(page_size) - 1) // int(page_size))
         st.markdown(f"**Total matches:** {total} | **Page:** {page} of {max_page} | **Page size:** {page_size}")
@@ -577,20 +1008,83 @@ def show_courses_page():
             },
         )
 
-        # Download current page
-        csv = df.to_csv(index=False).encode("utf-8")
-        st.download_button(
-            "⬇️ Download this page as CSV",
-            data=csv,
-            file_name=f"courses_page_{page}.csv",
-            mime="text/csv"
-        )
+        # Download current page. Serialization only happens after the
+        # prepare click, not on every fragment rerun.
+        if st.button("📥 Prepare CSV", key="courses_prepare_csv"):
+            st.session_state.courses_csv = df.to_csv(index=False).encode("utf-8")
+            st.session_state.courses_csv_page = int(page)
+        if st.session_state.get("courses_csv") is not None:
+            st.download_button(
+                "⬇️ Download this page as CSV",
+                data=st.session_state.courses_csv,
+                file_name=f"courses_page_{st.session_state.courses_csv_page}.csv",
+                mime="text/csv"
+            )
 
     except Exception as e:
         st.error(f"Error loading courses: {e}")
         st.stop()
 
 
+def show_batch_page():
+    """Admin page: run the recommendation pipeline for many students at once.
+
+    The pipeline is remote-API-bound (LLM + search calls), so a thread
+    pool overlaps the per-student latency; results render as each future
+    completes instead of after the slowest one.
+    """
+    _require_api()
+    st.header("🗂️ Batch Recommendations")
+    st.markdown(
+        "Upload a CSV with one student name per line (a `name` header row "
+        "is skipped). Each student must already have a profile ingested."
+    )
+
+    batch_file = st.file_uploader("Student names (CSV)", type=["csv", "txt"], key="batch_names")
+    batch_question = st.text_area(
+        "Question to ask for every student (optional):",
+        key="batch_question",
+        placeholder="What type of college should I apply to with this information?",
+    )
+
+    if not batch_file or not st.button("🚀 Run Batch", type="primary"):
+        return
+
+    # First comma-separated field per line; tolerate a header row.
+    names = []
+    for line in batch_file.getvalue().decode("utf-8", errors="replace").splitlines():
+        name = line.split(",")[0].strip()
+        if name and name.lower() != "name" and name not in names:
+            names.append(name)
+    if not names:
+        st.warning("No student names found in the file.")
+        return
+
+    question = batch_question.strip() or None
+    progress = st.progress(0.0, text=f"0 / {len(names)} students done")
+    results_box = st.container()
+    done = 0
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        # The raw (uncached) fetch: worker threads lack a ScriptRunContext,
+        # and the names list is already de-duplicated above.
+        futures = {
+            pool.submit(_fetch_recommendations_raw, name, question): name
+            for name in names
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            done += 1
+            progress.progress(done / len(names), text=f"{done} / {len(names)} students done")
+            try:
+                rec = future.result()
+            except Exception as e:
+                results_box.error(f"❌ {name}: {e}")
+                continue
+            with results_box.expander(f"✅ {name}"):
+                st.info(rec.get("student_analysis", "No analysis available"))
+                st.success(rec.get("course_recommendations", "No recommendations available"))
+
+
 def show_about_page(api_ok: bool):
     """About page with information"""
     st.header("ℹ️ About College Seeker")
@@ -632,12 +1126,14 @@ def show_about_page(api_ok: bool):
     """)
 
     with st.expander("🔧 System Status"):
-        st.markdown(f"**Backend API:** {'✅ Connected' if api_ok else '⚠️ Not reachable'}")
-        st.markdown(f"**API URL:** `{API_BASE_URL}`")
+        st.markdown(
+            f"**Backend API:** {'✅ Connected' if api_ok else '⚠️ Not reachable'}\n\n"
+            f"**API URL:** `{API_BASE_URL}`"
+        )
 
         if api_ok:
             try:
-                response = requests.get(f"{API_BASE_URL}/")
+                response = _api_session().get(f"{API_BASE_URL}/", timeout=(3, 30))
                 if response.status_code == 200:
                     data = response.json()
                     st.json(data)
@@ -4,9 +4,10 @@ from dotenv import load_dotenv
 load_dotenv(override=True)
 # from pymongo.mongo_client import MongoClient
 # from pymongo.server_api import ServerApi
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.chat_models import init_chat_model
 from langchain_community.document_loaders import WebBaseLoader
+from langchain_core.documents import Document
+from concurrent.futures import ThreadPoolExecutor
+import fitz  # PyMuPDF: C-backed PDF parsing, much faster than pypdf
 from langchain.agents import AgentState
 from langchain.agents.middleware import dynamic_prompt, ModelRequest
 
@@ -21,22 +22,24 @@ from langchain.agents.middleware import dynamic_prompt, ModelRequest
 #     print(e)
 class CustomState(AgentState):
     student_info: dict
-    
-uri=os.getenv("MONGODB_URI")
 
-from langchain_huggingface import HuggingFaceEmbeddings
+from models import get_embeddings, get_llm
+from prompting import build_context
+
+INSERT_BATCH_SIZE = int(os.getenv("INSERT_BATCH_SIZE", "128"))
+INSERT_WORKERS = int(os.getenv("INSERT_WORKERS", "4"))
 
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-mpnet-base-v2")
+# Shared, content-hash-cached embeddings loaded once per process (models.py).
+embeddings = get_embeddings()
 
 # if embeddings:
 #     print("Embeddings model loaded successfully!")
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_mongodb import MongoDBAtlasVectorSearch
-from pymongo import MongoClient
-from uuid import uuid4
+import hashlib
 
-# initialize MongoDB python client
-client = MongoClient(uri)
+# Shared, pool-tuned MongoDB client (see db.py)
+from db import client
 
 DB_NAME = "college_seeker"
 COLLECTION_NAME = "student_collection"
@@ -52,10 +55,15 @@ vector_store = MongoDBAtlasVectorSearch(
     relevance_score_fn="cosine",
 )
 
-# Create vector search index on the collection
-# Since we are using the default OpenAI embedding model (ada-v2) we need to specify the dimensions as 1536
-vector_store.create_vector_search_index(dimensions=768)
-llm = init_chat_model("google_genai:gemini-2.5-flash-lite")
+from db import ensure_vector_search_index
+
+
+def ensure_indexes():
+    """Declare the student vector index once (no-op when it already exists)."""
+    ensure_vector_search_index(vector_store, MONGODB_COLLECTION, ATLAS_VECTOR_SEARCH_INDEX_NAME)
+
+
+llm = get_llm("google_genai:gemini-2.5-flash-lite")
 
 # from uuid import uuid4
 
@@ -126,9 +134,80 @@ llm = init_chat_model("google_genai:gemini-2.5-flash-lite")
 # uuids = [str(uuid4()) for _ in range(len(documents))]
 
 # vector_store.add_documents(documents=documents, ids=uuids)
+def _add_documents_batched(docs):
+    """Insert docs in bounded batches, overlapping batches across threads.
+
+    Ids are the sha256 of the chunk text, so re-uploading the same PDF
+    only embeds and inserts chunks Atlas hasn't seen yet — a re-ingest of
+    unchanged content costs one distinct() query and no model work. Each
+    batch runs on its own pool connection so Atlas can pipeline inserts.
+    """
+    ids = [hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest() for doc in docs]
+    existing = set(MONGODB_COLLECTION.distinct("_id", {"_id": {"$in": ids}}))
+    # The dict also collapses duplicate chunks within the upload itself.
+    fresh = list(dict((i, doc) for i, doc in zip(ids, docs) if i not in existing).items())
+    if not fresh:
+        return
+    ids = [i for i, _ in fresh]
+    docs = [doc for _, doc in fresh]
+    batches = [
+        (docs[start:start + INSERT_BATCH_SIZE], ids[start:start + INSERT_BATCH_SIZE])
+        for start in range(0, len(docs), INSERT_BATCH_SIZE)
+    ]
+    if len(batches) <= 1:
+        for batch_docs, batch_ids in batches:
+            vector_store.add_documents(documents=batch_docs, ids=batch_ids)
+        return
+    with ThreadPoolExecutor(max_workers=INSERT_WORKERS) as pool:
+        futures = [
+            pool.submit(vector_store.add_documents, documents=batch_docs, ids=batch_ids)
+            for batch_docs, batch_ids in batches
+        ]
+        for future in futures:
+            future.result()
+
+
+def _invalidate_retrieval_cache():
+    # New profile documents can change what similarity search returns —
+    # and therefore any analysis generated from the old retrievals. The
+    # ingest paths don't know which student the upload belongs to, so the
+    # whole analysis cache (including its Mongo mirror) goes.
+    _retrieve_profile.cache_clear()
+    analysis_cache.clear()
+
+
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+
+def _extract_page_range(file_path, start, stop):
+    # Each worker opens its own handle: a fitz Document is not safe to
+    # share across threads, but the C extension releases the GIL while
+    # parsing so separate handles extract pages in parallel.
+    with fitz.open(file_path) as pdf:
+        return [(i, pdf[i].get_text("text")) for i in range(start, stop)]
+
+
+def _load_pdf_documents(file_path):
+    """Extract per-page text with PyMuPDF, fanning pages out over threads."""
+    with fitz.open(file_path) as pdf:
+        page_count = pdf.page_count
+    if not page_count:
+        return []
+    step = -(-page_count // PDF_WORKERS)  # ceil division
+    ranges = [(file_path, start, min(start + step, page_count))
+              for start in range(0, page_count, step)]
+    with ThreadPoolExecutor(max_workers=PDF_WORKERS) as pool:
+        chunks = pool.map(lambda args: _extract_page_range(*args), ranges)
+    return [
+        Document(page_content=text, metadata={"source": file_path, "page": i})
+        for chunk in chunks
+        for i, text in chunk
+        if text.strip()
+    ]
+
+
 def ingest_student_pdf(file_path):
-    loader = PyPDFLoader(file_path)
-    documents = loader.load()
+    documents = _load_pdf_documents(file_path)
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=1000,
         chunk_overlap=200,
@@ -136,9 +215,8 @@ def ingest_student_pdf(file_path):
     )
     docs = text_splitter.split_documents(documents)
 
-    uuids = [str(uuid4()) for _ in range(len(docs))]
-
-    vector_store.add_documents(documents=docs, ids=uuids)
+    _add_documents_batched(docs)
+    _invalidate_retrieval_cache()
     return f"Successfully ingested {file_path} with {len(docs)} chunks"
 
 
@@ -151,10 +229,21 @@ def ingest_student_web(url):
         length_function=len,
     )
     docs = text_splitter.split_documents(documents)
-    uuids = [str(uuid4()) for _ in range(len(docs))]
-    vector_store.add_documents(documents=docs, ids=uuids)
+    _add_documents_batched(docs)
+    _invalidate_retrieval_cache()
     return f"Successfully ingested {url} with {len(docs)} chunks"
 
+from functools import lru_cache
+
+
+@lru_cache(maxsize=256)
+def _retrieve_profile(search_query: str):
+    """Memoized profile retrieval so repeated agent turns for the same
+    student reuse one Atlas similarity search. Cleared whenever new
+    student documents are ingested."""
+    return tuple(vector_store.similarity_search(search_query))
+
+
 @dynamic_prompt
 def prompt_with_context(request: ModelRequest) -> str:
     """Inject context into state messages."""
@@ -164,11 +253,11 @@ def prompt_with_context(request: ModelRequest) -> str:
     
     # Use the student name to search for their profile
     search_query = f"{student_name}'s complete profile"
-    
-    # Perform similarity search based on the student's name
-    retrieved_docs = vector_store.similarity_search(search_query)
 
-    docs_content = "\n\n".join(doc.page_content for doc in retrieved_docs)
+    # Perform similarity search based on the student's name (memoized)
+    retrieved_docs = _retrieve_profile(search_query)
+
+    docs_content = build_context(retrieved_docs)
 
     system_message = (
         "You are an expert counselor reviewing the academic and extracurricular information below. "
@@ -179,19 +268,41 @@ def prompt_with_context(request: ModelRequest) -> str:
 
     return system_message
 
-llm=init_chat_model("google_genai:gemini-2.5-flash")
+llm=get_llm("google_genai:gemini-2.5-flash")
 agent= create_agent(llm, middleware=[prompt_with_context], state_schema=CustomState)
 
+from llm_batching import RequestCoalescer
+
+# Coalesces concurrent agent invocations into one batched Gemini call.
+_agent_batcher = RequestCoalescer(agent)
+
+from semantic_cache import SemanticCache
+
+# Partitioned by exact student name (the cache's scope), with only the
+# question embedded — similarity can merge rephrasings of one student's
+# question but can never cross students, however alike the questions are.
+analysis_cache = SemanticCache(embeddings, collection=client[DB_NAME]["analysis_cache"])
+
 def make_student_analysis(query: dict) -> str:
     """Function to analyze student profile based on the query.
-    
+
     Args:
         query: Dictionary containing messages and student_info with student details
-    
+
     Returns:
         The AI message content as a string
     """
-    response = agent.invoke(input=query)
+    student_name = (query.get("student_info") or {}).get("name", "")
+    messages = query.get("messages") or []
+    last_message = messages[-1].get("content", "") if messages else ""
+    return analysis_cache.get_or_compute(
+        last_message, lambda: _run_student_agent(query), scope=student_name
+    )
+
+
+def _run_student_agent(query: dict) -> str:
+    """Invoke the student agent and flatten its reply (cache-miss path)."""
+    response = _agent_batcher.submit(query)
     # Extract the AI message from the response
     ai_message = response["messages"][-1]
     content = getattr(ai_message, "content", "")
@@ -1,16 +1,32 @@
 # models_and_chain.py
+import hashlib
+import json
+import re
+from contextvars import ContextVar
 from datetime import datetime
 from dotenv import load_dotenv
 load_dotenv(override=True)
+from functools import lru_cache
 from typing import List, Optional
-from langchain.chat_models import init_chat_model
+from models import get_llm
 from langchain_tavily import TavilySearch
 from langchain.agents import create_agent
-from pydantic import BaseModel, Field  # safe for LC v1
+from langchain.agents.middleware import wrap_tool_call
+from pydantic import BaseModel, ConfigDict, Field  # safe for LC v1
 from langchain_core.runnables import RunnableSerializable
 
 # ----- Pydantic schema the LLM must fill -----
 class CourseSchema(BaseModel):
+    # frozen skips the mutability machinery (copies go through model_copy),
+    # extra="ignore" drops unknown LLM keys without the extra-field loop,
+    # and str_strip_whitespace normalizes model output during validation.
+    model_config = ConfigDict(
+        frozen=True,
+        str_strip_whitespace=True,
+        validate_default=False,
+        extra="ignore",
+    )
+
     institution_name: str = Field(..., description="Full official name of the institution")
     course_name: str = Field(..., description="Exact title as shown on page, e.g., 'B.Tech in Computer Engineering'")
     degree_level: Optional[str] = Field(None, description="Undergraduate, Postgraduate, Diploma/Certificate, Doctorate")
@@ -40,7 +56,56 @@ tavily_search_tool = TavilySearch(
     topic="general",
 )
 
+# Passages already fed to the model in the current agent run, keyed on a
+# whitespace-canonicalized hash. Search engines return the same
+# paragraphs across agent steps; every duplicate is prefill tokens paid
+# twice. The seen-set lives in a ContextVar so each run (each asyncio
+# task / thread, e.g. the concurrent per-page extractions) dedupes only
+# against what its own model has actually seen — a process-global set
+# would race and silently starve other runs of context.
+_WS = re.compile(r"\s+")
+_seen_passages: ContextVar = ContextVar("seen_passages", default=None)
+
+
+def _passage_key(text: str) -> str:
+    return hashlib.sha1(_WS.sub(" ", text.strip()).lower().encode("utf-8")).hexdigest()
+
 
+@wrap_tool_call
+def dedupe_search_results(request, handler):
+    """Drop search passages this agent run's model has already seen."""
+    response = handler(request)
+    content = getattr(response, "content", None)
+    payload = content
+    if isinstance(payload, str):
+        try:
+            payload = json.loads(payload)
+        except ValueError:
+            return response
+    if not isinstance(payload, dict) or not isinstance(payload.get("results"), list):
+        return response
+
+    seen = _seen_passages.get()
+    if seen is None:
+        seen = set()
+        _seen_passages.set(seen)
+    fresh = []
+    for item in payload["results"]:
+        text = item.get("content") if isinstance(item, dict) else None
+        if not text:
+            fresh.append(item)
+            continue
+        key = _passage_key(text)
+        if key in seen:
+            continue
+        seen.add(key)
+        fresh.append(item)
+    payload["results"] = fresh
+    response.content = json.dumps(payload) if isinstance(content, str) else payload
+    return response
+
+
+@lru_cache(maxsize=8)
 def build_extractor(
     prompt_fn,
     model_name: str = "google_genai:gemini-2.5-flash",
@@ -50,9 +115,13 @@ def build_extractor(
 
     The base chat model stays unwrapped so the compiler can still decide when to
     issue tool calls; schema enforcement now comes from `response_format`.
+
+    Cached per (prompt_fn, model_name): agent compilation registers tools and
+    derives the response schema, which is too heavy to repeat per invocation.
     """
-    llm = init_chat_model(model_name)
+    llm = get_llm(model_name)
     middleware = [prompt_fn] if prompt_fn is not None else []
+    middleware.append(dedupe_search_results)
     system_prompt = (
         "You extract structured course information. "
         "Use ONLY provided context (retrieved passages, user text, tool outputs). "